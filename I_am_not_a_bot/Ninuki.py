@@ -11,7 +11,16 @@ from board_base import DEFAULT_SIZE, GO_POINT, GO_COLOR
 from board import GoBoard
 from board_util import GoBoardUtil
 from engine import GoEngine
-from mcts import CustomMCTS
+from mcts import CustomMCTS, DEFAULT_TREE_BYTES
+from parallel import RootParallelMCTS
+from tree_parallel import TreeParallelMCTS
+from pool_mcts import PoolMCTS
+from time_manager import TimeManager
+from analysis import ANALYSIS_INTERVAL
+from book import OpeningBook, DEFAULT_BOOK_PATH
+from dfpn import DfpnSolver, SOLVER_EMPTY_POINTS, SOLVER_TIME_FRACTION
+from threat_space import ThreatSpaceSearch, THREAT_TIME_FRACTION
+import os
 import time
 import random
 import numpy as np
@@ -22,6 +31,7 @@ from board_base import (
     BORDER,
     GO_COLOR, GO_POINT,
     PASS,
+    NO_POINT,
     MAXSIZE,
     coord_to_point,
     opponent
@@ -35,26 +45,218 @@ class A4SubmissionPlayer(GoEngine):
         """
         GoEngine.__init__(self, "Go0", 1.0)
         self.time_limit = 1
+        self.time_manager = TimeManager(self.time_limit)
+        self.workers = 1
+        self.parallel_mode = "root"
+        self.tree_backend = "node"
+        self.search_stats = False
+        self.tree_bytes = DEFAULT_TREE_BYTES
+        # (batch_leaves, batch_playouts) and switches of the single process CustomMCTS
+        self.batch = (1, 1)
+        self.search_options = {"copy_free": True, "bitboard_rollouts": True, "symmetry": True}
+        self.analysis_output = None
+        self.analysis_interval = ANALYSIS_INTERVAL
+        # Mapped on the first genmove; None plays without a book
+        self.book = OpeningBook(DEFAULT_BOOK_PATH)
+        self.solver = DfpnSolver()
+        self.threat_search = ThreatSpaceSearch()
         self.MCTS = CustomMCTS()
     def get_move(self, board: GoBoard, color: GO_COLOR) -> GO_POINT:
         """
         Implement for assignment 4
         """
         exp,hw = 0.6,1
-        point = self.MCTS.get_move(board, color, self.time_limit, exp, hw)
+        start = time.time()
+        point = None
+        if self.book is not None:
+            point = self.book.get_move(board, color)
+        time_limit = self.time_manager.budget(board, color)
+        if point is None:
+            point = self.threat_search.find_win(board, color, THREAT_TIME_FRACTION * time_limit)
+        if point is None and board.n_empty <= SOLVER_EMPTY_POINTS:
+            # Play a proven win or draw; a loss or no result is left to the search
+            winner, point = self.solver.solve(board, SOLVER_TIME_FRACTION * time_limit)
+            if winner != color and winner != EMPTY:
+                point = None
+        if point is None:
+            time_limit -= time.time() - start
+            point = self.MCTS.get_move(board, color, time_limit, exp, hw)
+        self.time_manager.record(color, time.time() - start)
+        if point == NO_POINT:
+            # No search found a move; pass rather than make one up
+            return "pass"
         coord = point_to_coord(point, board.size)
         move = format_point(coord)
         return move
+    def solve_board(self, board: GoBoard):
+        """
+        Solve board within the time limit with the df-pn solver.
+        """
+        winner, point = self.solver.solve(board, self.time_limit)
+        if winner is None:
+            return "unknown", None
+        if winner == EMPTY:
+            result = "draw"
+        else:
+            result = "b" if winner == BLACK else "w"
+        if point is None:
+            return result, None
+        return result, format_point(point_to_coord(point, board.size))
+
+    def ponder(self, board: GoBoard, color: GO_COLOR, stop) -> None:
+        """
+        Grow the current tree until stop is set. Only the single process search ponders.
+        """
+        if isinstance(self.MCTS, CustomMCTS):
+            self.MCTS.ponder(board, color, stop)
+
+    def set_analysis(self, output, interval: float = ANALYSIS_INTERVAL) -> None:
+        """
+        Stream analysis lines to output while searching. Only the single process CustomMCTS search reports.
+        """
+        self.analysis_output = output
+        self.analysis_interval = interval
+        if isinstance(self.MCTS, CustomMCTS):
+            self.MCTS.set_analysis(output, interval)
+
+    def analyze(self, board: GoBoard, color: GO_COLOR, stop) -> None:
+        if isinstance(self.MCTS, CustomMCTS):
+            self.MCTS.analyze(board, color, stop)
+
     def update(self, board: GoBoard, move: str) -> None:
-        self.parent = self.MCTS.root
         coord = move_to_coord(move, board.size)
         point = coord_to_point(coord[0], coord[1], board.size) 
         self.MCTS.update_with_move(point)
     def reset(self) -> None:
-        self.MCTS = CustomMCTS()
+        self.MCTS.reset()
 
     def set_time_limit(self, time_limit):
         self.time_limit = time_limit
+        self.time_manager.set_move_time(time_limit)
+
+    def set_time_settings(self, main_time: float, byo_yomi_time: float, byo_yomi_stones: int) -> None:
+        self.time_manager.set_time_settings(main_time, byo_yomi_time, byo_yomi_stones)
+
+    def set_time_left(self, color: GO_COLOR, seconds: float, stones: int) -> None:
+        self.time_manager.set_time_left(color, seconds, stones)
+
+    def set_book(self, path: str) -> None:
+        """
+        Answer genmove from the opening book at path while the position is in it; None turns the book off.
+        """
+        if path is None:
+            self.book = None
+            return
+        if not os.path.exists(path):
+            raise ValueError("no book file " + path)
+        book = OpeningBook(path)
+        book.load()
+        self.book = book
+
+    def set_workers(self, workers: int) -> None:
+        """
+        Search with workers processes; 1 searches in this process.
+        The worker pool is started here and kept until the setting changes.
+        """
+        if workers == self.workers:
+            return
+        self.workers = workers
+        self._start_search()
+
+    def set_parallel_mode(self, mode: str) -> None:
+        """
+        "root": independent trees whose root statistics are merged.
+        "tree": one tree in shared memory grown by all workers.
+        """
+        assert mode in ("root", "tree")
+        if mode == self.parallel_mode:
+            return
+        self.parallel_mode = mode
+        self._start_search()
+
+    def set_tree_backend(self, backend: str) -> None:
+        """
+        Tree storage of the single process search:
+        "node": CustomTreeNode objects, "pool": a struct-of-arrays NodePool.
+        """
+        assert backend in ("node", "pool")
+        if backend == self.tree_backend:
+            return
+        self.tree_backend = backend
+        self._start_search()
+
+    def set_tree_budget(self, max_bytes: int) -> None:
+        """
+        Memory budget of the single process CustomMCTS or PoolMCTS tree.
+        """
+        self.tree_bytes = max_bytes
+        if isinstance(self.MCTS, (CustomMCTS, PoolMCTS)):
+            self.MCTS.set_tree_budget(max_bytes)
+
+    def get_tree_size(self):
+        """
+        (nodes, bytes) of the search tree, or None for the multi-process searches.
+        """
+        if isinstance(self.MCTS, (CustomMCTS, PoolMCTS)):
+            return self.MCTS.tree_size()
+        return None
+
+    def set_batch(self, batch_leaves: int, batch_playouts: int) -> None:
+        """
+        Select batch_leaves leaves per search step and evaluate each with
+        batch_playouts rollouts in one batch. 1 1 searches one leaf at a time.
+        """
+        self.batch = (batch_leaves, batch_playouts)
+        if isinstance(self.MCTS, CustomMCTS):
+            self.MCTS.set_batch(batch_leaves, batch_playouts)
+
+    def set_search_option(self, name: str, on: bool) -> None:
+        """
+        Switch copy_free, bitboard_rollouts or symmetry of the single process CustomMCTS search.
+        """
+        assert name in self.search_options
+        self.search_options[name] = on
+        if isinstance(self.MCTS, CustomMCTS):
+            self._apply_search_options()
+
+    def _apply_search_options(self) -> None:
+        self.MCTS.set_copy_free(self.search_options["copy_free"])
+        self.MCTS.set_bitboard_rollouts(self.search_options["bitboard_rollouts"])
+        self.MCTS.set_symmetry(self.search_options["symmetry"])
+
+    def set_search_stats(self, on: bool) -> None:
+        """
+        Record per-phase search statistics. Only the single process CustomMCTS search keeps them.
+        """
+        self.search_stats = on
+        if isinstance(self.MCTS, CustomMCTS):
+            self.MCTS.set_stats(on)
+
+    def get_search_stats(self) -> str:
+        """
+        Statistics of the last search, or None if none are recorded.
+        """
+        if isinstance(self.MCTS, CustomMCTS) and self.MCTS.stats is not None:
+            return self.MCTS.stats.report()
+        return None
+
+    def _start_search(self) -> None:
+        if isinstance(self.MCTS, (RootParallelMCTS, TreeParallelMCTS)):
+            self.MCTS.close()
+        if self.workers == 1 and self.tree_backend == "pool":
+            self.MCTS = PoolMCTS()
+            self.MCTS.set_tree_budget(self.tree_bytes)
+        elif self.workers == 1:
+            self.MCTS = CustomMCTS()
+            self.MCTS.set_stats(self.search_stats)
+            self.MCTS.set_tree_budget(self.tree_bytes)
+            self.MCTS.set_analysis(self.analysis_output, self.analysis_interval)
+            self.MCTS.set_batch(*self.batch)
+            self._apply_search_options()
+        elif self.parallel_mode == "tree":
+            self.MCTS = TreeParallelMCTS(self.workers)
+        else:
+            self.MCTS = RootParallelMCTS(self.workers)
 
 def run() -> None:
     """
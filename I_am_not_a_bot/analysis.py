@@ -0,0 +1,88 @@
+"""
+analysis.py
+Live search analysis in the format of Leela Zero's lz-analyze.
+
+Each report is one line describing the most visited root children:
+
+    info move D4 visits 120 winrate 5417 prior 1532 order 0 pv D4 E5 C3 info move ...
+
+winrate is the root player's win rate and prior the child's share of the
+sum of the cc_heur heuristic values of all root children, both in units
+of 1/10000. pv follows the most visited child from each move.
+"""
+from typing import Callable, List
+
+from board_base import opponent, GO_POINT
+from board import GoBoard
+from geometry import get_geometry
+# Nodes are tree.CustomTreeNode, not imported: tree imports gtp_connection, which imports this module
+
+"""
+Default number of root children in a report, and seconds between reports.
+"""
+ANALYSIS_MOVES: int = 10
+ANALYSIS_INTERVAL: float = 1.0
+MAX_PV_LENGTH: int = 20
+
+
+def principal_variation(node: 'CustomTreeNode', move: GO_POINT) -> List[GO_POINT]:
+    """
+    move followed by the most visited child of each node below it.
+    """
+    pv = [move]
+    while len(pv) < MAX_PV_LENGTH:
+        move, node = node.select_best_child()
+        if node is None or node.n_visits == 0:
+            break
+        pv.append(move)
+    return pv
+
+
+def analysis_line(root: 'CustomTreeNode', board: GoBoard, max_moves: int = ANALYSIS_MOVES) -> str:
+    """
+    Report on the visited or proven children of root, in the order of
+    select_best_child. A proven child's winrate is its game theoretic value.
+    board must be at the root position, the heuristic values of the children
+    are computed on it when missing.
+    """
+    strings = get_geometry(board.size).point_strings
+    total = 0.0
+    for move, child in root.children.items():
+        total += max(root.prior(move, child, board), 0)
+    lost = opponent(root.color)
+    visited = [(move, child) for move, child in root.children.items()
+               if child.n_visits > 0 or child.proven is not None]
+    visited.sort(key=lambda item: (item[1].proven == root.color, item[1].proven != lost, item[1].n_visits),
+                 reverse=True)
+    infos = []
+    for order, (move, child) in enumerate(visited[:max_moves]):
+        if child.proven is not None:
+            winrate = 10000 if child.proven == root.color else 0 if child.proven == lost else 5000
+        else:
+            winrate = round(10000 * child.n_opponent_wins / child.n_visits)
+        prior = round(10000 * max(root.priors[move], 0) / total) if total > 0 else 0
+        pv = " ".join(strings[point] for point in principal_variation(child, move))
+        infos.append("info move {} visits {} winrate {} prior {} order {} pv {}".format(
+            strings[move], child.n_visits, winrate, prior, order, pv))
+    return " ".join(infos)
+
+
+def reporting_clock(keep_going: Callable[[], bool], report: Callable[[], None],
+                    interval: float, clock: Callable[[], float]) -> Callable[[], bool]:
+    """
+    keep_going for run_search that also calls report every interval seconds.
+    The search can stop without asking keep_going, when it proves the root,
+    so the caller sends the last report itself (see CustomMCTS.report_analysis).
+    """
+    next_report = clock() + interval
+
+    def keep_going_and_report() -> bool:
+        nonlocal next_report
+        if not keep_going():
+            return False
+        now = clock()
+        if now >= next_report:
+            report()
+            next_report = now + interval
+        return True
+    return keep_going_and_report
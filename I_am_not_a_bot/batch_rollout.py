@@ -0,0 +1,159 @@
+"""
+batch_rollout.py
+Random playouts for many games at once with numpy.
+
+BatchRollout advances K games together. The positions are the rows of a
+(K, width) array in the padded 1-D layout of GoBoard, with extra BORDER
+padding on both ends so that point + 3 * offset never leaves the array.
+Each step picks one random empty point per running game, then resolves
+captures and five in a row for all of them with array operations that
+only touch the few points around each move.
+"""
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+
+from board_base import BLACK, WHITE, EMPTY, BORDER, GO_COLOR
+from board import GoBoard
+
+
+class BatchRollout(object):
+    def __init__(self, size: int) -> None:
+        """
+        Geometry for a board of the given size, shared by all rollouts of that size.
+        """
+        self.size: int = size
+        self.NS: int = size + 1
+        self.maxpoint: int = size * size + 3 * (size + 1)
+        self.pad: int = 4 * (self.NS + 1)
+        self.width: int = self.maxpoint + 2 * self.pad
+        NS = self.NS
+        self.offsets: np.ndarray = np.array([1, -1, NS, -NS, NS + 1, -(NS + 1), NS - 1, -NS + 1])
+        self.directions: List[int] = [1, NS, NS + 1, NS - 1]
+        self.points: np.ndarray = np.array([self.pad + row * NS + col
+                                            for row in range(1, size + 1)
+                                            for col in range(1, size + 1)])
+        self.max_redraws: int = 4
+        self.capture_rays: np.ndarray = np.array([offset * step for offset in self.offsets
+                                                  for step in (1, 2, 3)])
+        self.five_rays: np.ndarray = np.array([d * sign * step for d in self.directions
+                                               for sign in (1, -1) for step in (1, 2, 3, 4)])
+
+    def _pad(self, board_array: np.ndarray) -> np.ndarray:
+        row = np.full(self.width, BORDER, dtype=np.int8)
+        row[self.pad:self.pad + self.maxpoint] = board_array
+        return row
+
+    def position(self, board: GoBoard) -> Tuple[np.ndarray, int, int]:
+        """
+        (padded board row, black captures, white captures) of board for run_many,
+        without the rest of the GoBoard state.
+        """
+        return self._pad(board.board), board.black_captures, board.white_captures
+
+    def run(self, board: GoBoard, color: GO_COLOR, k: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Play k random games from the position on board with color to play.
+        Returns the k winners (BLACK, WHITE or EMPTY for a draw).
+        """
+        terminal, winner = board.EndGame()
+        if terminal:
+            return np.full(k, winner, dtype=np.int8)
+        return self.run_many([self.position(board)], [color], k, rng)[0]
+
+    def run_many(self, positions: List[Tuple[np.ndarray, int, int]], colors: List[GO_COLOR], k: int,
+                 rng: np.random.Generator) -> np.ndarray:
+        """
+        Play k random games from each position (see position), all in one batch.
+        The positions must not be over.
+        Returns an array of shape (len(positions), k) of winners.
+        """
+        n = len(positions)
+        states = np.empty((n * k, self.width), dtype=np.int8)
+        to_play = np.empty(n * k, dtype=np.int8)
+        black_captures = np.empty(n * k, dtype=np.int32)
+        white_captures = np.empty(n * k, dtype=np.int32)
+        winners = np.full(n * k, EMPTY, dtype=np.int8)
+        running = np.ones(n * k, dtype=bool)
+        for i, ((state, black, white), color) in enumerate(zip(positions, colors)):
+            rows = slice(i * k, (i + 1) * k)
+            states[rows] = state
+            to_play[rows] = color
+            black_captures[rows] = black
+            white_captures[rows] = white
+        self.simulate(states, to_play, black_captures, white_captures, winners, running, rng)
+        return winners.reshape(n, k)
+
+    def simulate(self, states: np.ndarray, to_play: np.ndarray, black_captures: np.ndarray,
+                 white_captures: np.ndarray, winners: np.ndarray, running: np.ndarray,
+                 rng: np.random.Generator) -> np.ndarray:
+        """
+        Advance all running games until each one ends, in place.
+        Returns the number of moves played in each game.
+        """
+        lengths = np.zeros(len(states), dtype=np.int32)
+        n_empty = (states == EMPTY).sum(axis=1)
+        active = np.flatnonzero(running)
+        while active.size > 0:
+            # Board full: a draw, winners already holds EMPTY
+            active = active[n_empty[active] > 0]
+            if active.size == 0:
+                break
+            moves = self._random_empty_points(states, active, rng)
+            color = to_play[active]
+            opp = (BLACK + WHITE) - color
+            states[active, moves] = color
+            rows = active[:, None]
+            # (games, 8 directions, 3 steps): the X-O-O-X pattern away from each move
+            line = states[rows, moves[:, None] + self.capture_rays].reshape(-1, 8, 3)
+            hit = (line[:, :, 0] == opp[:, None]) & (line[:, :, 1] == opp[:, None]) & (line[:, :, 2] == color[:, None])
+            captured = 2 * hit.sum(axis=1)
+            if captured.any():
+                g, direction = np.nonzero(hit)
+                first = moves[g] + self.offsets[direction]
+                states[active[g], first] = EMPTY
+                states[active[g], first + self.offsets[direction]] = EMPTY
+            is_black = color == BLACK
+            black_captures[active] += captured * is_black
+            white_captures[active] += captured * ~is_black
+            n_empty[active] += captured - 1
+            # (games, 4 directions, 2 signs, 4 steps): stones of the mover's color in a row
+            line = states[rows, moves[:, None] + self.five_rays].reshape(-1, 4, 2, 4)
+            run = np.cumprod(line == color[:, None, None, None], axis=3).sum(axis=3)
+            five = (run.sum(axis=2) >= 4).any(axis=1)
+            lengths[active] += 1
+            to_play[active] = opp
+            done = five | (black_captures[active] >= 10) | (white_captures[active] >= 10)
+            if done.any():
+                winner = np.where(five, color,
+                                  np.where(black_captures[active] >= 10, BLACK, WHITE))
+                winners[active[done]] = winner[done]
+                active = active[~done]
+        return lengths
+
+    def _random_empty_points(self, states: np.ndarray, active: np.ndarray,
+                             rng: np.random.Generator) -> np.ndarray:
+        """
+        One uniformly random empty point for each game in active.
+        Draws random board points and redraws the games that hit a stone;
+        games still unlucky after a few rounds pick among their empty points directly.
+        """
+        points = self.points
+        moves = points[rng.integers(0, points.size, active.size)]
+        retry = np.flatnonzero(states[active, moves] != EMPTY)
+        for _ in range(self.max_redraws):
+            if retry.size == 0:
+                return moves
+            moves[retry] = points[rng.integers(0, points.size, retry.size)]
+            retry = retry[states[active[retry], moves[retry]] != EMPTY]
+        if retry.size > 0:
+            empty = states[active[retry]] == EMPTY
+            keys = rng.random(empty.shape)
+            keys[~empty] = -1.0
+            moves[retry] = np.argmax(keys, axis=1)
+        return moves
+
+
+@lru_cache(maxsize=None)
+def get_batch_rollout(size: int) -> BatchRollout:
+    return BatchRollout(size)
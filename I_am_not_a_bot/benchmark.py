@@ -0,0 +1,278 @@
+"""
+benchmark.py
+End-to-end benchmark of CustomMCTS on fixed, seeded positions.
+
+For every board size three positions are generated from a seeded random
+game: an opening, a midgame after captures and a position a few moves
+before the end. CustomMCTS searches each one for a fixed time and the
+benchmark records simulations per second, tree nodes created, average
+rollout length and the time spent in each phase of a simulation. A second,
+shorter search of a fixed number of simulations runs under tracemalloc
+for the peak memory (tracemalloc slows the search down, so it is kept out
+of the timed run).
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.1
+    python benchmark.py --batch 8 4 --output batch.json
+
+--batch and the --no-* switches configure the search as the GTP batch and
+search_option commands do. Batched searches do not go through
+ProfiledMCTS.search, so they report no phase times or rollout lengths.
+
+With --baseline the results are compared with a stored run, and the exit
+status is 1 if simulations per second dropped or peak memory grew by more
+than the tolerance for any position.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from board_base import GO_COLOR
+from board import GoBoard
+from bitboard import BitBoard
+from mcts import CustomMCTS
+from tree import backup, count_nodes, solve_path
+
+BENCHMARK_SIZES: List[int] = [7, 9, 13, 19]
+BENCHMARK_SEED: int = 455
+SEARCH_TIME: float = 2.0
+MEMORY_SIMULATIONS: int = 300
+DEFAULT_TOLERANCE: float = 0.1
+
+
+class ProfiledMCTS(CustomMCTS):
+    """
+    CustomMCTS that times the phases of every simulation and counts rollout moves.
+    """
+    def __init__(self) -> None:
+        CustomMCTS.__init__(self)
+        self.early_stop = False
+        self.phase_time: Dict[str, float] = {"select": 0.0, "rollout": 0.0, "backup": 0.0}
+        self.rollouts: int = 0
+        self.rollout_moves: int = 0
+
+    def search(self, board: GoBoard, color: GO_COLOR) -> None:
+        start = time.perf_counter()
+        path, color = self.descend(board, color)
+        selected = time.perf_counter()
+        proven = path[-1].proven
+        if proven is not None:
+            winner = proven
+        else:
+            rollout_board = BitBoard.for_rollout(board) if self.bitboard_rollouts else board
+            n_moves = rollout_board.depth
+            winner = self.rollout(rollout_board, color)
+            self.rollout_moves += rollout_board.depth - n_moves
+            self.rollouts += 1
+        rolled_out = time.perf_counter()
+        backup(path, winner)
+        if proven is not None:
+            solve_path(path)
+        done = time.perf_counter()
+        self.phase_time["select"] += selected - start
+        self.phase_time["rollout"] += rolled_out - selected
+        self.phase_time["backup"] += done - rolled_out
+
+
+def _random_move(board: GoBoard, rng: random.Random):
+    # Sorted, so the positions do not depend on the order of the empty point index
+    return rng.choice(sorted(board.get_empty_points().tolist()))
+
+
+def benchmark_positions(size: int, seed: int = BENCHMARK_SEED) -> List[Tuple[str, GoBoard]]:
+    """
+    The (name, board) positions for a board size, the same for the same seed.
+    """
+    rng = random.Random(seed * 1000 + size)
+    positions = []
+
+    board = GoBoard(size)
+    for _ in range(2):
+        board.play_move(_random_move(board, rng), board.current_player)
+    positions.append(("opening", board))
+
+    while True:
+        board = GoBoard(size)
+        while not board.EndGame()[0]:
+            captures = board.get_captures(1) + board.get_captures(2)
+            if captures > 0 and len(board.move_history) >= size * size // 4:
+                break
+            board.play_move(_random_move(board, rng), board.current_player)
+        if not board.EndGame()[0]:
+            break
+    positions.append(("midgame", board))
+
+    while True:
+        board = GoBoard(size)
+        while not board.EndGame()[0]:
+            board.play_move(_random_move(board, rng), board.current_player)
+        if len(board.move_history) > 3:
+            board.undo_to(len(board.move_history) - 3)
+            if not board.EndGame()[0]:
+                break
+    positions.append(("near_terminal", board))
+    return positions
+
+
+def configure(mcts: CustomMCTS, options: Dict) -> None:
+    """
+    Apply the search options of the command line to mcts.
+    """
+    mcts.set_batch(*options["batch"])
+    mcts.set_copy_free(options["copy_free"])
+    mcts.set_bitboard_rollouts(options["bitboard_rollouts"])
+    mcts.set_symmetry(options["symmetry"])
+
+
+def timed_search(board: GoBoard, search_time: float, seed: int, options: Dict) -> Tuple[ProfiledMCTS, float]:
+    """
+    Search board for search_time seconds. Returns the search and the seconds it took.
+    """
+    color = board.current_player
+    random.seed(seed)
+    mcts = ProfiledMCTS()
+    configure(mcts, options)
+    mcts.rng = np.random.default_rng(seed)
+    mcts.toplay = color
+    mcts.reset_tree()
+    start = time.perf_counter()
+    deadline = start + search_time
+    mcts.run_search(board, color, lambda: time.perf_counter() < deadline)
+    return mcts, time.perf_counter() - start
+
+
+def run_position(board: GoBoard, search_time: float, seed: int, options: Dict, repeats: int = 1) -> Dict:
+    """
+    Benchmark results of one position. With repeats > 1 the timed search
+    is run that many times and the fastest run is reported.
+    """
+    color = board.current_player
+    runs = [timed_search(board, search_time, seed, options) for _ in range(repeats)]
+    mcts, elapsed = max(runs, key=lambda run: run[0].root.n_visits / run[1])
+    simulations = mcts.root.n_visits
+    nodes = count_nodes(mcts.root)
+
+    random.seed(seed)
+    memory = ProfiledMCTS()
+    configure(memory, options)
+    memory.rng = np.random.default_rng(seed)
+    memory.toplay = color
+    memory.reset_tree()
+    tracemalloc.start()
+    memory.run_search(board, color, lambda: memory.root.n_visits < MEMORY_SIMULATIONS)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    memory_nodes = count_nodes(memory.root)
+
+    phase_total = sum(mcts.phase_time.values())
+    return {
+        "simulations": simulations,
+        "seconds": elapsed,
+        "simulations_per_second": simulations / elapsed,
+        "nodes": nodes,
+        "nodes_per_second": nodes / elapsed,
+        "memory_simulations": MEMORY_SIMULATIONS,
+        "peak_bytes": peak,
+        "bytes_per_node": peak / memory_nodes,
+        "avg_rollout_length": mcts.rollout_moves / max(mcts.rollouts, 1),
+        "phase_seconds": dict(mcts.phase_time),
+        "phase_share": {phase: t / phase_total if phase_total > 0 else 0.0 for phase, t in mcts.phase_time.items()},
+    }
+
+
+def run_benchmark(sizes: List[int], search_time: float, seed: int, options: Dict, repeats: int = 1) -> Dict:
+    results = []
+    for size in sizes:
+        for name, board in benchmark_positions(size, seed):
+            result = run_position(board, search_time, seed, options, repeats)
+            result.update({"size": size, "position": name})
+            results.append(result)
+            print("{:2d}x{:<2d} {:14s} {:8.0f} sim/s {:8d} nodes {:10.0f} peak bytes {:6.1f} rollout moves".format(
+                size, size, name, result["simulations_per_second"], result["nodes"],
+                result["peak_bytes"], result["avg_rollout_length"]))
+            sys.stdout.flush()
+    return {
+        "meta": {
+            "seed": seed,
+            "search_time": search_time,
+            "repeats": repeats,
+            "options": options,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Regressions of current against baseline, as printable lines.
+    """
+    base = {(r["size"], r["position"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = (result["size"], result["position"])
+        if key not in base:
+            continue
+        old = base[key]
+        speed = result["simulations_per_second"] / old["simulations_per_second"]
+        memory = result["bytes_per_node"] / old["bytes_per_node"]
+        print("{:2d}x{:<2d} {:14s} speed {:6.2f}x   memory per node {:6.2f}x".format(
+            key[0], key[0], key[1], speed, memory))
+        if speed < 1 - tolerance:
+            regressions.append("{}x{} {}: simulations per second {:.0f} -> {:.0f}".format(
+                key[0], key[0], key[1], old["simulations_per_second"], result["simulations_per_second"]))
+        if memory > 1 + tolerance:
+            regressions.append("{}x{} {}: bytes per node {:.0f} -> {:.0f}".format(
+                key[0], key[0], key[1], old["bytes_per_node"], result["bytes_per_node"]))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark CustomMCTS on fixed positions.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES)
+    parser.add_argument("--time", type=float, default=SEARCH_TIME, help="search seconds per position")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per position, the fastest counts")
+    parser.add_argument("--seed", type=int, default=BENCHMARK_SEED)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown or memory growth")
+    parser.add_argument("--batch", type=int, nargs=2, default=[1, 1], metavar=("LEAVES", "PLAYOUTS"),
+                        help="leaves per search step and rollouts per leaf")
+    parser.add_argument("--no-copy-free", action="store_true", help="copy the board for every simulation")
+    parser.add_argument("--no-bitboard-rollouts", action="store_true", help="play rollouts on the GoBoard")
+    parser.add_argument("--no-symmetry", action="store_true", help="keep symmetric root moves")
+    args = parser.parse_args()
+
+    options = {
+        "batch": args.batch,
+        "copy_free": not args.no_copy_free,
+        "bitboard_rollouts": not args.no_bitboard_rollouts,
+        "symmetry": not args.no_symmetry,
+    }
+    results = run_benchmark(args.sizes, args.time, args.seed, options, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
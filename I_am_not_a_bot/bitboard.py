@@ -0,0 +1,460 @@
+"""
+bitboard.py
+A GoBoard backend that stores each color as a Python int bitboard.
+
+Bit i of self.black / self.white is set when a stone of that color is on
+point i of the same padded 1-D layout GoBoard uses (see coord_to_point).
+BORDER points are never set, so a line of stones can never run across an
+edge, exactly as with the padded numpy array.
+
+Five in a row and the X-O-O-X capture pattern are found with shifts and
+precomputed masks instead of reading one numpy element at a time.
+The rules API matches GoBoard, so BitBoard can be used wherever only
+play_move, undo, get_empty_points, EndGame and get_captures are needed.
+"""
+import numpy as np
+import random
+from functools import lru_cache
+from typing import List, Tuple
+
+from board_base import (
+    board_array_size,
+    coord_to_point,
+    opponent,
+    where1d,
+    BLACK,
+    WHITE,
+    EMPTY,
+    BORDER,
+    MAXSIZE,
+    NO_POINT,
+    PASS,
+    GO_COLOR,
+    GO_POINT,
+)
+from board import GoBoard
+from zobrist import get_zobrist_keys
+
+"""
+Random board points random_empty_point draws before it falls back to
+counting the empty points.
+"""
+MAX_REDRAWS: int = 8
+
+class BitMasks(object):
+    def __init__(self, size: int) -> None:
+        """
+        Masks for a board of the given size, shared by all BitBoards of that size.
+
+        on_board: bits of all points on the board
+        points: the points on the board
+        directions: the four line directions as shifts (E, N, NE, NW)
+        five[point]: per direction, the start bits of all 5-windows containing point
+        adjacent[point]: per direction, the bits of the two neighbours of point on that line
+        capture[point]: per one of 8 directions, (pair mask, pair points, end mask)
+                        for the pattern point-O-O-X
+        """
+        NS = size + 1
+        maxpoint = board_array_size(size)
+        self.size: int = size
+        self.maxpoint: int = maxpoint
+        self.nbytes: int = (maxpoint + 7) // 8
+        self.on_board: int = 0
+        self.points: List[int] = []
+        for row in range(1, size + 1):
+            for col in range(1, size + 1):
+                point = int(coord_to_point(row, col, size))
+                self.on_board |= 1 << point
+                self.points.append(point)
+        self.directions: List[int] = [1, NS, NS + 1, NS - 1]
+        self.five: List[List[int]] = [[] for _ in range(maxpoint)]
+        self.adjacent: List[List[int]] = [[] for _ in range(maxpoint)]
+        self.capture: List[List[Tuple[int, int, int, int]]] = [[] for _ in range(maxpoint)]
+        for point in range(maxpoint):
+            if not (self.on_board >> point) & 1:
+                continue
+            for d in self.directions:
+                starts = 0
+                for k in range(5):
+                    if point - k * d >= 0:
+                        starts |= 1 << (point - k * d)
+                self.five[point].append(starts)
+                self.adjacent[point].append((1 << (point + d)) | (1 << (point - d)))
+            for d in self.directions:
+                for offset in (d, -d):
+                    end = point + 3 * offset
+                    if 0 <= end < maxpoint and (self.on_board >> end) & 1:
+                        p1 = point + offset
+                        p2 = point + 2 * offset
+                        self.capture[point].append(((1 << p1) | (1 << p2), p1, p2, 1 << end))
+
+
+@lru_cache(maxsize=None)
+def get_bit_masks(size: int) -> BitMasks:
+    return BitMasks(size)
+
+
+class BitBoard(object):
+    def __init__(self, size: int) -> None:
+        """
+        Creates a bitboard of given size
+        """
+        assert 2 <= size <= MAXSIZE
+        self.reset(size)
+
+    @classmethod
+    def from_goboard(cls, goboard: GoBoard) -> 'BitBoard':
+        """
+        Build a BitBoard holding the same position and history as goboard.
+        """
+        b = cls(goboard.size)
+        black = np.packbits(goboard.board == BLACK, bitorder='little').tobytes()
+        white = np.packbits(goboard.board == WHITE, bitorder='little').tobytes()
+        b.black = int.from_bytes(black, 'little')
+        b.white = int.from_bytes(white, 'little')
+        b.last_move = goboard.last_move
+        b.last2_move = goboard.last2_move
+        b.current_player = goboard.current_player
+        b.black_captures = goboard.black_captures
+        b.white_captures = goboard.white_captures
+        b.depth = goboard.depth
+        b.black_capture_history = goboard.black_capture_history.copy()
+        b.white_capture_history = goboard.white_capture_history.copy()
+        b.move_history = goboard.move_history.copy()
+        b.hash = goboard.hash
+        return b
+
+    @classmethod
+    def for_rollout(cls, goboard: GoBoard) -> 'BitBoard':
+        """
+        Build a BitBoard holding the position of goboard without its history,
+        so the cost does not grow with the length of the game. Moves played on
+        it cannot be undone past the starting position.
+        """
+        b = cls(goboard.size)
+        black = np.packbits(goboard.board == BLACK, bitorder='little').tobytes()
+        white = np.packbits(goboard.board == WHITE, bitorder='little').tobytes()
+        b.black = int.from_bytes(black, 'little')
+        b.white = int.from_bytes(white, 'little')
+        b.last_move = goboard.last_move
+        b.last2_move = goboard.last2_move
+        b.current_player = goboard.current_player
+        b.black_captures = goboard.black_captures
+        b.white_captures = goboard.white_captures
+        b.depth = goboard.depth
+        b.hash = goboard.hash
+        return b
+
+    def reset(self, size: int) -> None:
+        """
+        Creates a start state, an empty board with given size.
+        """
+        self.size: int = size
+        self.NS: int = size + 1
+        self.WE: int = 1
+        self.last_move: GO_POINT = NO_POINT
+        self.last2_move: GO_POINT = NO_POINT
+        self.current_player: GO_COLOR = BLACK
+        self.maxpoint: int = board_array_size(size)
+        self.masks: BitMasks = get_bit_masks(size)
+        self.black: int = 0
+        self.white: int = 0
+        self.black_captures = 0
+        self.white_captures = 0
+        self.depth = 0
+        self.black_capture_history = []
+        self.white_capture_history = []
+        self.move_history = []
+        self.zobrist = get_zobrist_keys(size)
+        self.hash: int = 0
+
+    def copy(self) -> 'BitBoard':
+        b = BitBoard.__new__(BitBoard)
+        b.__dict__.update(self.__dict__)
+        b.black_capture_history = self.black_capture_history.copy()
+        b.white_capture_history = self.white_capture_history.copy()
+        b.move_history = self.move_history.copy()
+        return b
+
+    @property
+    def board(self) -> np.ndarray:
+        """
+        The position as a padded numpy array, in the GoBoard encoding.
+        Built on every access; meant for display, not for the hot path.
+        """
+        nbytes = self.masks.nbytes
+        black = np.unpackbits(np.frombuffer(self.black.to_bytes(nbytes, 'little'), dtype=np.uint8),
+                              bitorder='little')[:self.maxpoint]
+        white = np.unpackbits(np.frombuffer(self.white.to_bytes(nbytes, 'little'), dtype=np.uint8),
+                              bitorder='little')[:self.maxpoint]
+        on_board = np.unpackbits(np.frombuffer(self.masks.on_board.to_bytes(nbytes, 'little'), dtype=np.uint8),
+                                 bitorder='little')[:self.maxpoint]
+        array = np.where(on_board == 1, EMPTY, BORDER).astype(GO_POINT)
+        array[black == 1] = BLACK
+        array[white == 1] = WHITE
+        return array
+
+    def get_captures(self, color: GO_COLOR) -> int:
+        if color == BLACK:
+            return self.black_captures
+        elif color == WHITE:
+            return self.white_captures
+
+    def get_color(self, point: GO_POINT) -> GO_COLOR:
+        bit = 1 << int(point)
+        if self.black & bit:
+            return BLACK
+        if self.white & bit:
+            return WHITE
+        if self.masks.on_board & bit:
+            return EMPTY
+        return BORDER
+
+    def pt(self, row: int, col: int) -> GO_POINT:
+        return coord_to_point(row, col, self.size)
+
+    def row_start(self, row: int) -> int:
+        assert row >= 1
+        assert row <= self.size
+        return row * self.NS + 1
+
+    def is_legal(self, point: GO_POINT, color: GO_COLOR) -> bool:
+        if point == PASS:
+            return True
+        return self.get_color(point) == EMPTY
+
+    def empty_bits(self) -> int:
+        return self.masks.on_board & ~(self.black | self.white)
+
+    def get_empty_points(self) -> np.ndarray:
+        """
+        Return:
+            The empty points on the board
+        """
+        bits = np.unpackbits(np.frombuffer(self.empty_bits().to_bytes(self.masks.nbytes, 'little'), dtype=np.uint8),
+                             bitorder='little')
+        return where1d(bits[:self.maxpoint])
+
+    def random_empty_point(self) -> GO_POINT:
+        """
+        A uniformly random empty point. The board must not be full.
+        Draws random board points until one is empty; on a nearly full board
+        it picks among the empty bits instead.
+        """
+        occupied = self.black | self.white
+        points = self.masks.points
+        for _ in range(MAX_REDRAWS):
+            point = random.choice(points)
+            if not (occupied >> point) & 1:
+                return point
+        empty = self.masks.on_board & ~occupied
+        for _ in range(random.randrange(bin(empty).count("1"))):
+            empty &= empty - 1
+        return (empty & -empty).bit_length() - 1
+
+    def end_of_game(self) -> bool:
+        return self.empty_bits() == 0 or (self.last_move == PASS and self.last2_move == PASS)
+
+    def _place(self, point: int, color: GO_COLOR) -> List[int]:
+        """
+        Put a stone of color on point and remove the pairs it captures.
+        Returns the captured points. Captures counts and hash are updated.
+        """
+        z = self.zobrist
+        bit = 1 << point
+        if color == BLACK:
+            own = self.black | bit
+            opp = self.white
+        else:
+            own = self.white | bit
+            opp = self.black
+        O = opponent(color)
+        h = self.hash ^ z.stones[color][point]
+        captured = []
+        for pair, p1, p2, end in self.masks.capture[point]:
+            if opp & pair == pair and own & end:
+                opp ^= pair
+                captured.append(p1)
+                captured.append(p2)
+                h ^= z.stones[O][p1] ^ z.stones[O][p2]
+        if color == BLACK:
+            self.black, self.white = own, opp
+        else:
+            self.white, self.black = own, opp
+        if captured:
+            h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+            if color == BLACK:
+                self.black_captures += len(captured)
+            else:
+                self.white_captures += len(captured)
+            h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self.hash = h
+        return captured
+
+    def _remove(self, point: int, black_captured: List, white_captured: List) -> GO_COLOR:
+        """
+        Take the stone on point off again and put back the captured stones.
+        Returns the color of the removed stone.
+        """
+        z = self.zobrist
+        bit = 1 << point
+        color = BLACK if self.black & bit else WHITE
+        h = self.hash ^ z.stones[color][point]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        if color == BLACK:
+            self.black ^= bit
+        else:
+            self.white ^= bit
+        for p in black_captured:
+            self.white |= 1 << p
+            h ^= z.stones[WHITE][p]
+        for p in white_captured:
+            self.black |= 1 << p
+            h ^= z.stones[BLACK][p]
+        self.black_captures -= len(black_captured)
+        self.white_captures -= len(white_captured)
+        self.hash = h ^ z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        return color
+
+    def play_move(self, point: GO_POINT, color: GO_COLOR) -> bool:
+        """
+        Tries to play a move of color on the point.
+        Returns whether or not the point was empty.
+        """
+        point = int(point)
+        if not (0 <= point < self.maxpoint):
+            return False
+        bit = 1 << point
+        if (self.black | self.white) & bit or not self.masks.on_board & bit:
+            return False
+        z = self.zobrist
+        self.hash ^= z.to_play[self.current_player] ^ z.to_play[opponent(color)]
+        captured = self._place(point, color)
+        self.current_player = opponent(color)
+        self.last2_move = self.last_move
+        self.last_move = point
+        self.depth += 1
+        if color == BLACK:
+            self.black_capture_history.append(captured)
+            self.white_capture_history.append([])
+        else:
+            self.black_capture_history.append([])
+            self.white_capture_history.append(captured)
+        self.move_history.append(point)
+        return True
+
+    def undo_move(self) -> None:
+        """
+        Take back the last play_move, including any stones it captured.
+        The color of the removed stone becomes the player to move again.
+        """
+        move = self.move_history.pop()
+        z = self.zobrist
+        self.hash ^= z.to_play[self.current_player]
+        color = self._remove(move, self.black_capture_history.pop(), self.white_capture_history.pop())
+        self.hash ^= z.to_play[color]
+        self.current_player = color
+        self.depth -= 1
+        n = len(self.move_history)
+        self.last_move = self.move_history[-1] if n > 0 else NO_POINT
+        self.last2_move = self.move_history[-2] if n > 1 else NO_POINT
+
+    def undo_to(self, n_moves: int) -> None:
+        """
+        Take back moves with undo_move until n_moves remain in the move history.
+        """
+        while len(self.move_history) > n_moves:
+            self.undo_move()
+
+    def play_rm(self, point: GO_POINT, color: GO_COLOR) -> bool:
+        """
+        Place a stone without touching the move history or the player to move.
+        Taken back with undo(point).
+        """
+        captured = self._place(int(point), color)
+        if color == BLACK:
+            self.black_capture_history.append(captured)
+            self.white_capture_history.append([])
+        else:
+            self.black_capture_history.append([])
+            self.white_capture_history.append(captured)
+        return len(captured) > 0
+
+    def undo(self, move: GO_POINT) -> None:
+        self._remove(int(move), self.black_capture_history.pop(), self.white_capture_history.pop())
+
+    def five_detect(self, move: GO_POINT) -> GO_COLOR:
+        """
+        Returns the color of the stone on move if it is part of five or more in a row.
+        """
+        bit = 1 << int(move)
+        if self.black & bit:
+            c, stones = BLACK, self.black
+        elif self.white & bit:
+            c, stones = WHITE, self.white
+        else:
+            return EMPTY
+        starts = self.masks.five[int(move)]
+        adjacent = self.masks.adjacent[int(move)]
+        for i, d in enumerate(self.masks.directions):
+            if not stones & adjacent[i]:
+                continue
+            runs = stones & (stones >> d) & (stones >> (2 * d)) & (stones >> (3 * d)) & (stones >> (4 * d))
+            if runs & starts[i]:
+                return c
+        return EMPTY
+
+    def detect_five_in_a_row(self) -> GO_COLOR:
+        """
+        Returns BLACK or WHITE if any five in a row is detected for the color
+        EMPTY otherwise.
+        Only checks around the last move for efficiency.
+        """
+        if self.last_move == NO_POINT or self.last_move == PASS:
+            return EMPTY
+        return self.five_detect(self.last_move)
+
+    def EndGame(self) -> Tuple[bool, GO_COLOR]:
+        winner = self.detect_five_in_a_row()
+        if winner != EMPTY:
+            return True, winner
+        elif self.black_captures >= 10:
+            return True, BLACK
+        elif self.white_captures >= 10:
+            return True, WHITE
+        elif self.end_of_game():
+            return True, EMPTY
+        else:
+            return False, EMPTY
+
+    def is_terminal(self) -> Tuple[bool, GO_COLOR]:
+        return self.EndGame()
+
+    def last_board_moves(self) -> List:
+        board_moves: List[GO_POINT] = []
+        if self.last_move != NO_POINT and self.last_move != PASS:
+            board_moves.append(self.last_move)
+        if self.last2_move != NO_POINT and self.last2_move != PASS:
+            board_moves.append(self.last2_move)
+        return board_moves
+
+    def compute_hash(self) -> int:
+        """
+        Zobrist key of the position computed from scratch, as GoBoard.compute_hash.
+        """
+        z = self.zobrist
+        h = z.to_play[self.current_player]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        for point in range(self.maxpoint):
+            if (self.black >> point) & 1:
+                h ^= z.stones[BLACK][point]
+            elif (self.white >> point) & 1:
+                h ^= z.stones[WHITE][point]
+        return h
+
+    def state_to_str(self) -> str:
+        state = np.array2string(self.board, separator='')
+        state += str(self.current_player)
+        state += str(self.black_captures)
+        state += str(self.white_captures)
+        return state
@@ -11,6 +11,7 @@ Implements a basic Go board with functions to:
 The board uses a 1-dimensional representation with padding
 """
 import numpy as np
+from functools import lru_cache
 from typing import List, Tuple
 import random
 
@@ -31,6 +32,38 @@ from board_base import (
     GO_COLOR,
     GO_POINT,
 )
+from geometry import get_geometry, BoardGeometry
+from patterns import get_line_tables, open_four_table, line_windows, line_score, PATTERN_LENGTH
+from zobrist import get_zobrist_keys
+
+
+"""
+Heuristic values of a point only depend on stones along the four lines
+through it, and GoBoard.hr never looks further than THREAT_REACH points
+away (GoBoard.capture looks 3 points away).
+"""
+THREAT_REACH: int = 6
+
+
+@lru_cache(maxsize=None)
+def threat_lines(size: int) -> List[np.ndarray]:
+    """
+    For every point, the points within THREAT_REACH along its four lines,
+    including the point itself. A stone change at a point can only change
+    the heuristic values of these points.
+    """
+    NS = size + 1
+    maxpoint = board_array_size(size)
+    lines = []
+    for point in range(maxpoint):
+        points = [point]
+        for d in (1, NS, NS + 1, NS - 1):
+            for k in range(1, THREAT_REACH + 1):
+                for p in (point + k * d, point - k * d):
+                    if 0 <= p < maxpoint:
+                        points.append(p)
+        lines.append(np.array(points))
+    return lines
 
 
 """
@@ -55,7 +88,6 @@ class GoBoard(object):
         self.black_capture_history = []
         self.white_capture_history = []
         self.move_history = []
-        self.offsets = [1, -1, self.NS, -self.NS, self.NS+1, -(self.NS+1), self.NS-1, -self.NS+1]
 
     def add_two_captures(self, color: GO_COLOR) -> None:
         if color == BLACK:
@@ -82,30 +114,88 @@ class GoBoard(object):
         self.maxpoint: int = board_array_size(size)
         self.board: np.ndarray[GO_POINT] = np.full(self.maxpoint, BORDER, dtype=GO_POINT)
         self._initialize_empty_points(self.board)
+        # Empty point index: the empty points are empty_points[:n_empty],
+        # empty_index[point] is the position of point in it (-1 if not empty)
+        self.empty_points: np.ndarray = where1d(self.board == EMPTY).astype(GO_POINT)
+        self.n_empty: int = self.empty_points.size
+        self.empty_index: np.ndarray = np.full(self.maxpoint, -1, dtype=np.int32)
+        self.empty_index[self.empty_points] = np.arange(self.n_empty)
         self.black_captures = 0
         self.white_captures = 0
         self.depth = 0
         self.black_capture_history = []
         self.white_capture_history = []
         self.move_history = []
+        self.zobrist = get_zobrist_keys(size)
+        self.hash: int = 0
+        self.geometry: BoardGeometry = get_geometry(size)
+        self.offsets: List[int] = self.geometry.offsets
+        self.rows: List[List[GO_POINT]] = self.geometry.rows
+        self.cols: List[List[GO_POINT]] = self.geometry.cols
+        self.diags: List[List[GO_POINT]] = self.geometry.diags
+        # Threat map: hr and capture counts per color and point, recomputed
+        # on demand for points whose lines were touched since (threat_dirty)
+        self.threat_lines: List[np.ndarray] = threat_lines(size)
+        self.hr_map: np.ndarray = np.zeros((3, self.maxpoint))
+        self.capture_map: np.ndarray = np.zeros((3, self.maxpoint), dtype=np.int32)
+        self.threat_dirty: np.ndarray = np.ones(self.maxpoint, dtype=bool)
+        # Line pattern tables for hr and detect_three_and_four, see patterns.py
+        self.line_windows: np.ndarray = line_windows(size, PATTERN_LENGTH)
+        self.line_tables = get_line_tables(PATTERN_LENGTH)
 
     def copy(self) -> 'GoBoard':
-        b = GoBoard(self.size)
-        assert b.NS == self.NS
-        assert b.WE == self.WE
+        """
+        An independent copy of the board. The per-size tables (zobrist keys,
+        geometry, threat lines, pattern windows and tables) are shared, so
+        the copy does not build them again through reset.
+        """
+        b = GoBoard.__new__(GoBoard)
+        b.size = self.size
+        b.NS = self.NS
+        b.WE = self.WE
         b.last_move = self.last_move
         b.last2_move = self.last2_move
         b.current_player = self.current_player
-        assert b.maxpoint == self.maxpoint
+        b.maxpoint = self.maxpoint
         b.board = np.copy(self.board)
+        b.empty_points = self.empty_points.copy()
+        b.n_empty = self.n_empty
+        b.empty_index = self.empty_index.copy()
         b.black_captures = self.black_captures
         b.white_captures = self.white_captures
         b.depth = self.depth
         b.black_capture_history = self.black_capture_history.copy()
         b.white_capture_history = self.white_capture_history.copy()
         b.move_history = self.move_history.copy()
+        b.zobrist = self.zobrist
+        b.hash = self.hash
+        b.geometry = self.geometry
+        b.offsets = self.offsets
+        b.rows = self.rows
+        b.cols = self.cols
+        b.diags = self.diags
+        b.threat_lines = self.threat_lines
+        b.hr_map = self.hr_map.copy()
+        b.capture_map = self.capture_map.copy()
+        b.threat_dirty = self.threat_dirty.copy()
+        b.line_windows = self.line_windows
+        b.line_tables = self.line_tables
         return b
 
+    def compute_hash(self) -> int:
+        """
+        Zobrist key of the position computed from scratch.
+        play_move, play_rm, undo_move and undo keep self.hash equal to this incrementally.
+        """
+        z = self.zobrist
+        h = z.to_play[self.current_player]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        for point in where1d(self.board == BLACK):
+            h ^= z.stones[BLACK][point]
+        for point in where1d(self.board == WHITE):
+            h ^= z.stones[WHITE][point]
+        return h
+
     def get_color(self, point: GO_POINT) -> GO_COLOR:
         return self.board[point]
 
@@ -126,14 +216,36 @@ class GoBoard(object):
         return self.board[point] == EMPTY
 
     def end_of_game(self) -> bool:
-        return self.get_empty_points().size == 0 or (self.last_move == PASS and self.last2_move == PASS)
+        return self.n_empty == 0 or (self.last_move == PASS and self.last2_move == PASS)
            
     def get_empty_points(self) -> np.ndarray:
         """
         Return:
-            The empty points on the board
+            The empty points on the board, in no particular order
         """
-        return where1d(self.board == EMPTY)
+        return self.empty_points[:self.n_empty].copy()
+
+    def random_empty_point(self) -> GO_POINT:
+        """
+        A uniformly random empty point. The board must not be full.
+        """
+        return self.empty_points[random.randrange(self.n_empty)]
+
+    def _add_empty(self, point: GO_POINT) -> None:
+        self.empty_index[point] = self.n_empty
+        self.empty_points[self.n_empty] = point
+        self.n_empty += 1
+
+    def _remove_empty(self, point: GO_POINT) -> None:
+        """
+        Swap-remove point from the empty point index.
+        """
+        self.n_empty -= 1
+        i = self.empty_index[point]
+        last = self.empty_points[self.n_empty]
+        self.empty_points[i] = last
+        self.empty_index[last] = i
+        self.empty_index[point] = -1
 
     def row_start(self, row: int) -> int:
         assert row >= 1
@@ -158,48 +270,128 @@ class GoBoard(object):
         """
         if self.board[point] != EMPTY:
             return False
+        z = self.zobrist
+        O = opponent(color)
+        h = self.hash ^ z.stones[color][point] ^ z.to_play[self.current_player] ^ z.to_play[O]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
         self.board[point] = color
-        self.current_player = opponent(color)
+        self._remove_empty(point)
+        self.current_player = O
         self.last2_move = self.last_move
         self.last_move = point
-        O = opponent(color)
-        offsets = [1, -1, self.NS, -self.NS, self.NS+1, -(self.NS+1), self.NS-1, -self.NS+1]
+        board = self.board
         bcs = []
         wcs = []
-        for offset in offsets:
-            if self.board[point+offset] == O and self.board[point+(offset*2)] == O and self.board[point+(offset*3)] == color:
-                self.board[point+offset] = EMPTY
-                self.board[point+(offset*2)] = EMPTY
+        for p1, p2, p3 in self.geometry.capture_rays[point]:
+            if board[p1] == O and board[p2] == O and board[p3] == color:
+                board[p1] = EMPTY
+                board[p2] = EMPTY
+                self._add_empty(p1)
+                self._add_empty(p2)
+                h ^= z.stones[O][p1] ^ z.stones[O][p2]
                 if color == BLACK:
                     self.black_captures += 2
-                    bcs.append(point+offset)
-                    bcs.append(point+(offset*2))
+                    bcs.append(p1)
+                    bcs.append(p2)
                 else:
                     self.white_captures += 2
-                    wcs.append(point+offset)
-                    wcs.append(point+(offset*2))
+                    wcs.append(p1)
+                    wcs.append(p2)
+        self.hash = h ^ z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self._touch(point, bcs + wcs)
         self.depth += 1
         self.black_capture_history.append(bcs)
         self.white_capture_history.append(wcs)
         self.move_history.append(point)
         return True
     
-    def undo(self):
-        self.board[self.move_history.pop()] = EMPTY
-        self.current_player = opponent(self.current_player)
+    def undo_move(self) -> None:
+        """
+        Take back the last play_move, including any stones it captured.
+        The color of the removed stone becomes the player to move again.
+        (The other undo(move) takes back play_rm, which has no move history.)
+        """
+        z = self.zobrist
+        move = self.move_history.pop()
+        color = self.board[move]
+        h = self.hash ^ z.stones[color][move] ^ z.to_play[self.current_player] ^ z.to_play[color]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self.board[move] = EMPTY
+        self._add_empty(move)
+        self.current_player = color
         self.depth -= 1
         bcs = self.black_capture_history.pop()
         for point in bcs:
             self.board[point] = WHITE
+            self._remove_empty(point)
             self.black_captures -= 1
+            h ^= z.stones[WHITE][point]
         wcs = self.white_capture_history.pop()
         for point in wcs:
             self.board[point] = BLACK
+            self._remove_empty(point)
             self.white_captures -= 1
-        if len(self.move_history) > 0:
-            self.last_move = self.move_history[-1]
-        if len(self.move_history) > 1:
-            self.last2_move = self.move_history[-2]
+            h ^= z.stones[BLACK][point]
+        self.hash = h ^ z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self._touch(move, bcs + wcs)
+        n = len(self.move_history)
+        self.last_move = self.move_history[-1] if n > 0 else NO_POINT
+        self.last2_move = self.move_history[-2] if n > 1 else NO_POINT
+
+    def undo_to(self, n_moves: int) -> None:
+        """
+        Take back play_move calls until n_moves remain in the move history.
+        Same result as calling undo_move repeatedly, in one pass over the history.
+        """
+        k = len(self.move_history) - n_moves
+        if k <= 0:
+            return
+        z = self.zobrist
+        stones = z.stones
+        board = self.board
+        h = self.hash ^ z.to_play[self.current_player]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        moves = self.move_history[n_moves:]
+        bch = self.black_capture_history[-k:]
+        wch = self.white_capture_history[-k:]
+        color = EMPTY
+        for i in range(k - 1, -1, -1):
+            move = moves[i]
+            color = board[move]
+            h ^= stones[color][move]
+            board[move] = EMPTY
+            self._add_empty(move)
+            for point in bch[i]:
+                board[point] = WHITE
+                self._remove_empty(point)
+                self.black_captures -= 1
+                h ^= stones[WHITE][point]
+            for point in wch[i]:
+                board[point] = BLACK
+                self._remove_empty(point)
+                self.white_captures -= 1
+                h ^= stones[BLACK][point]
+            self._touch(move, bch[i] + wch[i])
+        del self.move_history[n_moves:]
+        del self.black_capture_history[-k:]
+        del self.white_capture_history[-k:]
+        self.current_player = color
+        self.depth -= k
+        h ^= z.to_play[color]
+        self.hash = h ^ z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self.last_move = self.move_history[-1] if n_moves > 0 else NO_POINT
+        self.last2_move = self.move_history[-2] if n_moves > 1 else NO_POINT
+
+    def _touch(self, point: GO_POINT, captured: List) -> None:
+        """
+        Mark the threat map stale along the lines through point
+        and through every captured or restored point.
+        """
+        dirty = self.threat_dirty
+        lines = self.threat_lines
+        dirty[lines[point]] = True
+        for p in captured:
+            dirty[lines[p]] = True
 
     def neighbors_of_color(self, point: GO_POINT, color: GO_COLOR) -> List:
         """ List of neighbors of point of given color """
@@ -215,16 +407,10 @@ class GoBoard(object):
         opp_color = opponent(color)
 
         for move in legal_moves:
-            captured = self.play_rm(move, color)
-            terminal, winner = self.eog(move)
-            self.undo(move)
-            if terminal and winner == color:
+            if self.wins_at(move, color):
                 rule_moves['Win'].append(move)
                 continue
-            self.play_rm(move, opp_color)
-            terminal, winner = self.eog(move)
-            self.undo(move)
-            if terminal and winner == opp_color:
+            if self.wins_at(move, opp_color):
                 rule_moves['BlockWin'].append(move)
                 continue
             num = self.detect_three_and_four(move, color)
@@ -232,22 +418,39 @@ class GoBoard(object):
                 rule_moves['OpenThree'].append(move)
             elif num == 4:
                 rule_moves['OpenFour'].append(move)
-            if captured:
+            if self.capture_count(move, color) > 0:
                 rule_moves['Capture'].append(move)
             else:
                 rule_moves['Other'].append(move)
 
         return rule_moves
+
+    def wins_at(self, point: GO_POINT, color: GO_COLOR) -> bool:
+        """
+        Whether color wins by playing on the empty point, with five in a row
+        or a tenth capture. Same as play_rm, eog and undo without playing.
+        """
+        board = self.board
+        for forward, backward in self.geometry.lines[point]:
+            num_found = 1
+            for p in forward:
+                if board[p] != color:
+                    break
+                num_found += 1
+            for p in backward:
+                if board[p] != color:
+                    break
+                num_found += 1
+            if num_found >= 5:
+                return True
+        return self.get_captures(color) + self.capture_count(point, color) >= 10
     def _neighbors(self, point: GO_POINT) -> List:
         """ List of all four neighbors of the point """
-        return [point - 1, point + 1, point - self.NS, point + self.NS]
+        return self.geometry.neighbors[point]
 
     def _diag_neighbors(self, point: GO_POINT) -> List:
         """ List of all four diagonal neighbors of point """
-        return [point - self.NS - 1,
-                point + self.NS + 1,
-                point - self.NS + 1,
-                point + self.NS - 1]
+        return self.geometry.diag_neighbors[point]
 
     def eog(self, move):
         winner = self.five_detect(move)
@@ -280,21 +483,7 @@ class GoBoard(object):
         """
         if self.last_move == NO_POINT or self.last_move == PASS:
             return EMPTY
-        c = self.board[self.last_move]
-        for offset in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-            i = 1
-            num_found = 1
-            while self.board[self.last_move + i * offset[0] * self.NS + i * offset[1]] == c:
-                i += 1
-                num_found += 1
-            i = -1
-            while self.board[self.last_move + i * offset[0] * self.NS + i * offset[1]] == c:
-                i -= 1
-                num_found += 1
-            if num_found >= 5:
-                return c
-        
-        return EMPTY
+        return self.five_detect(self.last_move)
 
     def EndGame(self):
             winner = self.detect_five_in_a_row()
@@ -316,152 +505,95 @@ class GoBoard(object):
         state += str(self.white_captures)
         return state
     def play_rm(self, point: GO_POINT, color: GO_COLOR) -> bool:
+        z = self.zobrist
+        h = self.hash ^ z.stones[color][point]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
         self.board[point] = color
+        self._remove_empty(point)
         captured = False
         opponent_color = opponent(color)
-        offsets = [1, -1, self.NS, -self.NS, self.NS+1, -(self.NS+1), self.NS-1, -self.NS+1]
+        board = self.board
         black_captures = []
         white_captures = []
-        index = 0
-        while index < len(offsets):
-            offset = offsets[index]
-            if self.board[point+offset] == opponent_color and self.board[point+(offset*2)] == opponent_color and self.board[point+(offset*3)] == color:
-                self.board[point+offset] = EMPTY
-                self.board[point+(offset*2)] = EMPTY
+        for p1, p2, p3 in self.geometry.capture_rays[point]:
+            if board[p1] == opponent_color and board[p2] == opponent_color and board[p3] == color:
+                board[p1] = EMPTY
+                board[p2] = EMPTY
+                self._add_empty(p1)
+                self._add_empty(p2)
+                h ^= z.stones[opponent_color][p1] ^ z.stones[opponent_color][p2]
                 if color == BLACK:
                     self.black_captures += 2
-                    black_captures.append(point+offset)
-                    black_captures.append(point+(offset*2))
+                    black_captures.append(p1)
+                    black_captures.append(p2)
                     captured = True
                 else:
                     self.white_captures += 2
-                    white_captures.append(point+offset)
-                    white_captures.append(point+(offset*2))
+                    white_captures.append(p1)
+                    white_captures.append(p2)
                     captured = True
-            index += 1
+        self.hash = h ^ z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self._touch(point, black_captures + white_captures)
         self.black_capture_history.append(black_captures)
         self.white_capture_history.append(white_captures)
         return captured
+
+    def line_codes(self, point: GO_POINT) -> List[int]:
+        """ Base-4 codes of the eight half line windows through point, see patterns.py """
+        return (self.board[self.line_windows[point]] @ self.line_tables.powers).tolist()
+
     def hr(self, point, color):
+        codes = self.line_codes(point)
+        first = self.line_tables.hr_first[color]
+        second = self.line_tables.hr_second[color]
         heuristic = 0
-        opp_color = opponent(color)
-        
-        def calculate_heuristic(neighbors, diag=False):
-            nonlocal heuristic
-            count = 1
-            closed = 0
-            dc = 1
-
-            for i, nb in enumerate(neighbors):
-                if i % 2 == 0:
-                    if count > 1:
-                        heuristic += self.cc_hrl(count, dc, closed)
-                    count = 1
-                    closed = 0
-                    dc = 1
-                neighbor = nb
-                while self.board[neighbor] == color:
-                    count += 1
-                    if count == 5:
-                        break
-                    neighbor = self._diag_neighbors(neighbor)[i] if diag else self._neighbors(neighbor)[i]
-                if self.board[neighbor] != EMPTY:
-                    closed += 1
-                elif self.board[neighbor] == EMPTY and count < 4:
-                    neighbor = self._diag_neighbors(neighbor)[i] if diag else self._neighbors(neighbor)[i]
-                    if neighbor == opp_color:
-                        dc = 0.9 
-                    elif self.board[neighbor] == color:
-                        dc = 0.9
-                        while self.board[neighbor] == color:
-                            count += 1
-                            neighbor = self._diag_neighbors(neighbor)[i] if diag else self._neighbors(neighbor)[i]
-                            if count >= 5:
-                                count -= 1
-                                break
-                        if self.board[neighbor] != EMPTY:
-                            closed += 1
-
-            if count > 1:
-                heuristic += self.cc_hrl(count, dc, closed)
-
-        calculate_heuristic(self._neighbors(point))
-        calculate_heuristic(self._diag_neighbors(point), diag=True)
-        
+        for i in range(0, 8, 2):
+            count, variant = first[codes[i]]
+            if count >= 5:
+                heuristic += 10 ** 5
+            else:
+                heuristic += second[count][codes[i + 1]][variant]
         return heuristic
 
-
     def cc_hrl(self, count, dc, closed):
-        if count >= 5:
-            return 10 ** 5
-        elif closed == 0:
-            return (10 ** count) * dc
-        elif closed == 1 and count != 2:
-            return (10 ** (count - 1)) * dc
-        else:
-            return 0
+        return line_score(count, dc, closed)
 
     def detect_three_and_four(self, point, color):
-        neighbors = self._neighbors(point)
+        codes = self.line_codes(point)
+        runs = self.line_tables.runs[color]
         max_count = 1
-
-        i = 0
-        while i < len(neighbors):
-            if i % 2 == 0:
-                count = 1
-                closed = False
-            if closed:
-                i += 1
+        for i in range(0, 8, 2):
+            stones, is_open = runs[codes[i]]
+            count = 1 + stones
+            if not is_open:
                 continue
-            neighbor = neighbors[i]
-            while self.board[neighbor] == color:
-                count += 1
-                neighbor = self._neighbors(neighbor)[i]
-            if self.board[neighbor] != EMPTY:
-                closed = True
-            elif max(max_count, count) > max_count:
+            if count > max_count:
                 max_count = count
                 if max_count == 4:
                     return 4
-            i += 1
-
-        neighbors = self._diag_neighbors(point)
-        i = 0
-        while i < len(neighbors):
-            if i % 2 == 0:
-                count = 1
-                closed = False
-            if closed:
-                i += 1
-                continue
-            neighbor = neighbors[i]
-            while self.board[neighbor] == color:
-                count += 1
-                neighbor = self._diag_neighbors(neighbor)[i]
-            if self.board[neighbor] != EMPTY:
-                closed = True
-            elif max(max_count, count) > max_count:
+            stones, is_open = runs[codes[i + 1]]
+            count += stones
+            if is_open and count > max_count:
                 max_count = count
                 if max_count == 4:
                     return 4
-            i += 1
-
         return max_count
 
     def is_captured(self, point, color):
         O = opponent(color)
-        offsets = [1, -1, self.NS, -self.NS, self.NS+1, -(self.NS+1), self.NS-1, -self.NS+1]
-        for offset in offsets:
-            if self.board[point+offset] == O and self.board[point+(offset*2)] == O and self.board[point+(offset*3)] == color:
+        board = self.board
+        for p1, p2, p3 in self.geometry.capture_rays[point]:
+            if board[p1] == O and board[p2] == O and board[p3] == color:
                 return True
         return False
 
     def capture(self, point, color):
         heuristic = 0
         captures = 0
-        O = opponent(color)     
-        for offset in self.offsets:
-            if self.board[point+offset] == O and self.board[point+(offset*2)] == O and self.board[point+(offset*3)] == color:
+        O = opponent(color)
+        board = self.board
+        for p1, p2, p3 in self.geometry.capture_rays[point]:
+            if board[p1] == O and board[p2] == O and board[p3] == color:
                 captures += 2
         if captures > 0:
             heuristic += self.cc_capture(color, captures)
@@ -480,35 +612,74 @@ class GoBoard(object):
             else:
                 return 10 ** ((self.white_captures + new_captures) / 2)
 
+    def capture_count(self, point, color):
+        """ Number of stones color would capture by playing on point """
+        captures = 0
+        O = opponent(color)
+        board = self.board
+        for p1, p2, p3 in self.geometry.capture_rays[point]:
+            if board[p1] == O and board[p2] == O and board[p3] == color:
+                captures += 2
+        return captures
+
+    def threat(self, point, color):
+        """
+        hr(point, color) + capture(point, color) from the threat map.
+        The map entry is recomputed only if a stone changed on one of the lines through point.
+        """
+        if self.threat_dirty[point]:
+            for c in (BLACK, WHITE):
+                self.hr_map[c, point] = self.hr(point, c)
+                self.capture_map[c, point] = self.capture_count(point, c)
+            self.threat_dirty[point] = False
+        heuristic = self.hr_map[color, point]
+        captures = self.capture_map[color, point]
+        if captures > 0:
+            heuristic += self.cc_capture(color, captures)
+        return heuristic
+
     def cc_heur(self, point, color):
-        player_heuristic = self.hr(point, color) + self.capture(point, color)
-        opp_heuristic = self.hr(point, opponent(color)) + self.capture(point, opponent(color))
+        player_heuristic = self.threat(point, color)
+        opp_heuristic = self.threat(point, opponent(color))
         mix_factor = 1/6
         heuristic = mix_factor * player_heuristic + (1 - mix_factor) * opp_heuristic / 10
         return heuristic
 
     def undo(self, move):
+        z = self.zobrist
+        h = self.hash ^ z.stones[self.board[move]][move]
+        h ^= z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
         self.board[move] = EMPTY
+        self._add_empty(move)
         black_captures = self.black_capture_history.pop()
         for point in black_captures:
             self.board[point] = WHITE
+            self._remove_empty(point)
             self.black_captures -= 1
+            h ^= z.stones[WHITE][point]
         white_captures = self.white_capture_history.pop()
         for point in white_captures:
             self.board[point] = BLACK
+            self._remove_empty(point)
             self.white_captures -= 1
+            h ^= z.stones[BLACK][point]
+        self.hash = h ^ z.captures[BLACK][self.black_captures] ^ z.captures[WHITE][self.white_captures]
+        self._touch(move, black_captures + white_captures)
 
     def five_detect(self, move) -> GO_COLOR:
-        c = self.board[move]
-        for offset in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-            i = 1
+        board = self.board
+        c = board[move]
+        if c == EMPTY:
+            return EMPTY
+        for forward, backward in self.geometry.lines[move]:
             num_found = 1
-            while self.board[move + i * offset[0] * self.NS + i * offset[1]] == c:
-                i += 1
+            for point in forward:
+                if board[point] != c:
+                    break
                 num_found += 1
-            i = -1
-            while self.board[move + i * offset[0] * self.NS + i * offset[1]] == c:
-                i -= 1
+            for point in backward:
+                if board[point] != c:
+                    break
                 num_found += 1
             if num_found >= 5:
                 return c
@@ -522,21 +693,7 @@ class GoBoard(object):
         """
         if self.last_move == NO_POINT or self.last_move == PASS:
             return EMPTY
-        c = self.board[self.last_move]
-        for offset in [(1, 0), (0, 1), (1, 1), (1, -1)]:
-            i = 1
-            num_found = 1
-            while self.board[self.last_move + i * offset[0] * self.NS + i * offset[1]] == c:
-                i += 1
-                num_found += 1
-            i = -1
-            while self.board[self.last_move + i * offset[0] * self.NS + i * offset[1]] == c:
-                i -= 1
-                num_found += 1
-            if num_found >= 5:
-                return c
-        
-        return EMPTY
+        return self.five_detect(self.last_move)
 
     def is_terminal(self):
         """
@@ -600,40 +757,18 @@ class GoBoard(object):
         Checks if there is an open-four configuration in the list and returns the color
         of the stones involved.
         """
-        length = len(list)
         op4_pos = []
-
-        for i in range(length - 6 + 1):  # Minimum board size of 5
-            window = list[i:i+6]  # Get the current 6-element window
-
-
-            # Pattern .X.XX.
-            if (self.get_color(window[0]) == EMPTY and self.get_color(window[1]) != EMPTY and
-                self.get_color(window[1]) == self.get_color(window[3]) == self.get_color(window[4]) and
-                self.get_color(window[2]) == EMPTY and self.get_color(window[5]) == EMPTY):
-                op4_pos.append((self.get_color(window[1]), list[i+2]))
-
-                # return (self.get_color(window[1]), list[i+2])
-
-            # Pattern .XXX..
-            elif (self.get_color(window[0]) == EMPTY and self.get_color(window[1]) != EMPTY and
-                self.get_color(window[1]) == self.get_color(window[2]) == self.get_color(window[3]) and 
-                self.get_color(window[4]) == EMPTY and self.get_color(window[5]) == EMPTY):
-            
-                op4_pos.append((self.get_color(window[1]), list[i+4]))
-                # return (self.get_color(window[1]), list[i+4])
-
-            # Pattern ..XXX.
-            elif (self.get_color(window[0]) == EMPTY and self.get_color(window[2]) != EMPTY and
-                self.get_color(window[2]) == self.get_color(window[3]) == self.get_color(window[4]) and
-                self.get_color(window[1]) == EMPTY and self.get_color(window[5]) == EMPTY):
-                op4_pos.append((self.get_color(window[2]), list[i+1]))
-                # return (self.get_color(window[2]), list[i+1])
-
-            # Pattern .XX.X.
-            elif (self.get_color(window[0]) == EMPTY and self.get_color(window[1]) != EMPTY and
-                self.get_color(window[1]) == self.get_color(window[2]) == self.get_color(window[4]) and 
-                self.get_color(window[3]) == EMPTY and self.get_color(window[5]) == EMPTY):
-                op4_pos.append((self.get_color(window[1]), list[i+3]))
-                # return (self.get_color(window[1]), list[i+3])
+        if len(list) < 6:  # Minimum board size of 5
+            return op4_pos
+        table = open_four_table()
+        colors = self.board[list].tolist()
+        # Base-4 code of the window ending at cell j, window[0] least significant
+        code = 0
+        for j, color in enumerate(colors):
+            code = code // 4 + color * 4 ** 5
+            if j >= 5:
+                found = table[code]
+                if found is not None:
+                    color, offset = found
+                    op4_pos.append((color, list[j - 5 + offset]))
         return op4_pos
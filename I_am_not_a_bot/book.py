@@ -0,0 +1,212 @@
+"""
+book.py
+Opening book: moves for early positions, found offline by deep CustomMCTS searches.
+
+The book file is a 16 byte header (BOOK_MAGIC, format version, number of
+records) followed by fixed size records (hash, size, move, visits, value)
+sorted by hash. hash is the canonical hash of the position with the side
+to move (see symmetry.py), size the board size, move a point of the
+canonical image of the position, visits the move's visit count in the
+search and value its win rate for the side to move. Symmetric positions
+share their records.
+
+OpeningBook maps the file with numpy.memmap the first time it is asked
+for a move and finds positions by binary search on the hash column, so
+neither startup nor a lookup reads more than a few pages of the file.
+
+    python book.py --sizes 7 9 --depth 3 --width 2 --time 30 --output book.bin
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from board_base import GO_COLOR, GO_POINT
+from board import GoBoard
+from mcts import CustomMCTS
+from symmetry import get_symmetry
+
+BOOK_MAGIC: bytes = b"NINUKIBK"
+BOOK_VERSION: int = 2
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("count", "<u4")])
+RECORD_DTYPE = np.dtype([("hash", "<u8"), ("size", "u1"), ("move", "<u2"),
+                         ("visits", "<u4"), ("value", "<f4")])
+
+"""
+Default book of the player, next to this file. The player runs without a book if it is missing.
+"""
+DEFAULT_BOOK_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
+"""
+Book moves found with fewer visits are not played.
+"""
+MIN_BOOK_VISITS: int = 100
+
+
+def position_key(board: GoBoard, color: GO_COLOR) -> Tuple[int, int]:
+    """
+    (canonical hash, s) of board with color to move: the symmetry s maps
+    board to the image with the smallest hash.
+    """
+    z = board.zobrist
+    hashes = get_symmetry(board.size).hashes(board)
+    hashes ^= np.uint64(z.to_play[board.current_player] ^ z.to_play[color])
+    s = int(np.argmin(hashes))
+    return int(hashes[s]), s
+
+
+class OpeningBook(object):
+    def __init__(self, path: str, min_visits: int = MIN_BOOK_VISITS) -> None:
+        self.path: str = path
+        self.min_visits: int = min_visits
+        self.records: np.ndarray = None
+        self.loaded: bool = False
+
+    def load(self) -> None:
+        """
+        Map the book file. A missing file gives an empty book.
+        """
+        self.loaded = True
+        if not os.path.exists(self.path):
+            return
+        header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != BOOK_MAGIC or header["version"][0] != BOOK_VERSION:
+            raise ValueError("{} is not a version {} book".format(self.path, BOOK_VERSION))
+        count = int(header["count"][0])
+        if count > 0:
+            self.records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r",
+                                     offset=HEADER_DTYPE.itemsize, shape=(count,))
+
+    def __len__(self) -> int:
+        if not self.loaded:
+            self.load()
+        return 0 if self.records is None else len(self.records)
+
+    def entries(self, board: GoBoard, color: GO_COLOR) -> np.ndarray:
+        """
+        The records of board with color to move, most visited first,
+        with their moves mapped back from the canonical image to board.
+        """
+        if not self.loaded:
+            self.load()
+        if self.records is None:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        key, s = position_key(board, color)
+        first = self.lower_bound(key)
+        last = first
+        while last < len(self.records) and int(self.records[last]["hash"]) == key:
+            last += 1
+        entries = np.array(self.records[first:last])
+        entries = entries[entries["size"] == board.size]
+        entries["move"] = get_symmetry(board.size).inverses[s, entries["move"]]
+        return entries
+
+    def lower_bound(self, key: int) -> int:
+        """
+        Index of the first record with hash >= key. A binary search by hand:
+        numpy.searchsorted would copy the whole strided hash column of the map.
+        """
+        low, high = 0, len(self.records)
+        while low < high:
+            middle = (low + high) // 2
+            if int(self.records[middle]["hash"]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_move(self, board: GoBoard, color: GO_COLOR) -> Optional[GO_POINT]:
+        """
+        The book move for color on board, or None if the position is not in the book.
+        """
+        for entry in self.entries(board, color):
+            move = int(entry["move"])
+            if entry["visits"] >= self.min_visits and board.board[move] == 0:
+                return move
+        return None
+
+
+def write_book(path: str, records: np.ndarray) -> None:
+    """
+    Sort records by hash, most visited first within a hash, and write them as a book file.
+    """
+    order = np.lexsort((-records["visits"].astype(np.int64), records["hash"]))
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = BOOK_MAGIC
+    header["version"] = BOOK_VERSION
+    header["count"] = len(records)
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(records[order].tobytes())
+
+
+def book_records(board: GoBoard, search_time: float, width: int) -> np.ndarray:
+    """
+    Search board for search_time seconds and return records of the width most visited moves.
+    """
+    color = board.current_player
+    mcts = CustomMCTS()
+    mcts.early_stop = False
+    mcts.toplay = color
+    mcts.reset_tree()
+    mcts.get_move(board, color, search_time, 0.6, 1)
+    children = sorted(mcts.root.children.items(), key=lambda item: item[1].n_visits, reverse=True)[:width]
+    key, s = position_key(board, color)
+    to_canonical = get_symmetry(board.size).permutations[s]
+    records = np.zeros(len(children), dtype=RECORD_DTYPE)
+    for i, (move, child) in enumerate(children):
+        records[i] = (key, board.size, to_canonical[move], child.n_visits,
+                      child.n_opponent_wins / max(child.n_visits, 1))
+    return records
+
+
+def build_book(sizes: List[int], depth: int, width: int, search_time: float) -> np.ndarray:
+    """
+    Records of every position reached from the empty board by following
+    the width best moves of each side for depth moves.
+    """
+    records = []
+    for size in sizes:
+        positions = [GoBoard(size)]
+        for ply in range(depth):
+            next_positions = []
+            for board in positions:
+                found = book_records(board, search_time, width)
+                records.append(found)
+                print("{}x{} ply {} {:3d} stones: {}".format(
+                    size, size, ply, len(board.move_history),
+                    " ".join("{}:{}".format(int(r["move"]), int(r["visits"])) for r in found)))
+                sys.stdout.flush()
+                # Record moves are on the canonical image; play them on board
+                key, s = position_key(board, board.current_player)
+                to_board = get_symmetry(board.size).inverses[s]
+                for move in found["move"]:
+                    child = board.copy()
+                    child.play_move(int(to_board[move]), board.current_player)
+                    if not child.EndGame()[0]:
+                        next_positions.append(child)
+            positions = next_positions
+    return np.concatenate(records) if records else np.zeros(0, dtype=RECORD_DTYPE)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build an opening book with deep CustomMCTS searches.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7])
+    parser.add_argument("--depth", type=int, default=2, help="moves from the empty board")
+    parser.add_argument("--width", type=int, default=2, help="moves of each position that are searched further")
+    parser.add_argument("--time", type=float, default=30.0, help="search seconds per position")
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH)
+    args = parser.parse_args()
+
+    start = time.time()
+    records = build_book(args.sizes, args.depth, args.width, args.time)
+    write_book(args.output, records)
+    print("{} records written to {} in {:.0f} s".format(len(records), args.output, time.time() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import threading
+from typing import Callable, Optional, Tuple
 from board_base import GO_POINT, NO_POINT
 from board import GoBoard
 
@@ -19,4 +21,32 @@ class GoEngine:
         version : version number used by the GTP interface
         """
         pass
-        
\ No newline at end of file
+
+    def ponder(self, board: GoBoard, color: int, stop: threading.Event) -> None:
+        """
+        Think on the opponent's time until stop is set. Called in a background thread.
+        The default engine does not ponder.
+        """
+        pass
+
+    def set_analysis(self, output: Callable[[str], None], interval: float) -> None:
+        """
+        Send analysis lines to output every interval seconds during get_move and analyze;
+        output None stops it. The default engine has no analysis.
+        """
+        pass
+
+    def analyze(self, board: GoBoard, color: int, stop: threading.Event) -> None:
+        """
+        Search without playing until stop is set, reporting to the set_analysis output.
+        Called in a background thread. The default engine does not analyze.
+        """
+        pass
+
+    def solve_board(self, board: GoBoard) -> Tuple[str, Optional[str]]:
+        """
+        (winner, move) for the GTP solve command: winner is "b", "w", "draw" or
+        "unknown", move the move of the player to move if it wins or holds the
+        draw. The default engine does not solve.
+        """
+        return "unknown", None
@@ -0,0 +1,110 @@
+"""
+geometry.py
+Per board size tables of the padded 1-D board layout.
+
+Everything here depends only on the board size, so it is computed once per
+size and shared by every GoBoard of that size and by the GTP coordinate
+conversion, instead of redoing point arithmetic in the hot loops.
+"""
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from board_base import board_array_size, coord_to_point, MAXSIZE
+
+"""
+Length of the rays from each point. Captures look 3 points away and five
+in a row detection 4 points away.
+"""
+RAY_LENGTH: int = 5
+
+COLUMN_LETTERS: str = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+"""
+COORD_STRINGS[row][col]: the GTP string of (row, col), as GtpConnection.format_point prints it.
+"""
+COORD_STRINGS: List[List[str]] = [[COLUMN_LETTERS[col - 1] + str(row) for col in range(MAXSIZE + 1)]
+                                  for row in range(MAXSIZE + 1)]
+
+
+class BoardGeometry(object):
+    def __init__(self, size: int) -> None:
+        """
+        Tables for a board of the given size, indexed by point.
+
+        offsets: the 8 directions, in the order of GoBoard.offsets
+        rays[point][d]: the points from point in direction offsets[d], up to
+            RAY_LENGTH of them, stopping before the border
+        capture_rays[point]: (p1, p2, p3) of every ray with at least 3 points,
+            in direction order, for the X-O-O-X capture pattern
+        lines[point]: (forward ray, backward ray) of the 4 lines through point
+        neighbors[point], diag_neighbors[point]: as GoBoard._neighbors and _diag_neighbors
+        coords[point]: (row, col)
+        point_strings[point]: GTP string such as 'A1' for points on the board
+        string_points: GTP string (lower case) to point
+        rows, cols, diags: the points of every row, column and diagonal of at
+            least 5 points, in order, for GoBoard.detect_open_four
+        """
+        NS = size + 1
+        self.size: int = size
+        self.NS: int = NS
+        self.maxpoint: int = board_array_size(size)
+        self.offsets: List[int] = [1, -1, NS, -NS, NS + 1, -(NS + 1), NS - 1, -NS + 1]
+        on_board = [False] * self.maxpoint
+        for row in range(1, size + 1):
+            for col in range(1, size + 1):
+                on_board[coord_to_point(row, col, size)] = True
+
+        self.rays: List[List[Tuple[int, ...]]] = []
+        self.capture_rays: List[List[Tuple[int, int, int]]] = []
+        self.lines: List[List[Tuple[Tuple[int, ...], Tuple[int, ...]]]] = []
+        self.neighbors: List[List[int]] = []
+        self.diag_neighbors: List[List[int]] = []
+        self.coords: List[Tuple[int, int]] = []
+        self.point_strings: List[str] = []
+        self.string_points: Dict[str, int] = {}
+        for point in range(self.maxpoint):
+            rays = []
+            for offset in self.offsets:
+                ray = []
+                p = point + offset
+                while len(ray) < RAY_LENGTH and 0 <= p < self.maxpoint and on_board[p]:
+                    ray.append(p)
+                    p += offset
+                rays.append(tuple(ray))
+            self.rays.append(rays)
+            self.capture_rays.append([ray[:3] for ray in rays if len(ray) >= 3])
+            self.lines.append([(rays[d], rays[d + 1]) for d in range(0, 8, 2)])
+            self.neighbors.append([point - 1, point + 1, point - NS, point + NS])
+            self.diag_neighbors.append([point - NS - 1, point + NS + 1, point - NS + 1, point + NS - 1])
+            row, col = divmod(point, NS)
+            self.coords.append((row, col))
+            if on_board[point]:
+                self.point_strings.append(COORD_STRINGS[row][col])
+                self.string_points[COORD_STRINGS[row][col].lower()] = point
+            else:
+                self.point_strings.append("")
+
+        self.rows: List[List[int]] = [[coord_to_point(row, col, size) for col in range(1, size + 1)]
+                                      for row in range(1, size + 1)]
+        self.cols: List[List[int]] = [[coord_to_point(row, col, size) for row in range(1, size + 1)]
+                                      for col in range(1, size + 1)]
+        self.diags: List[List[int]] = []
+        for start in [point for row in self.rows for point in row]:
+            for offset in (NS + 1, NS - 1):
+                if start - offset >= 0 and on_board[start - offset]:
+                    continue
+                diag = []
+                p = start
+                while 0 <= p < self.maxpoint and on_board[p]:
+                    diag.append(p)
+                    p += offset
+                if len(diag) >= 5:
+                    self.diags.append(diag)
+
+
+@lru_cache(maxsize=None)
+def get_geometry(size: int) -> BoardGeometry:
+    """
+    Return the tables for a board size. They are created once and shared by all boards.
+    """
+    return BoardGeometry(size)
@@ -11,6 +11,7 @@ at the University of Edinburgh.
 import traceback
 import numpy as np
 import re
+import threading
 import time
 from sys import stdin, stdout, stderr
 from typing import Any, Callable, Dict, List, Tuple
@@ -27,8 +28,10 @@ from board_base import (
     opponent
 )
 from board import GoBoard
+from geometry import get_geometry, COORD_STRINGS
 from board_util import GoBoardUtil
 from engine import GoEngine
+from analysis import ANALYSIS_INTERVAL
 
 class GtpConnection:
     def __init__(self, engine: GoEngine, board: GoBoard, debug_mode: bool = False) -> None:
@@ -46,6 +49,12 @@ class GtpConnection:
         self.time_limit = 1
         self.solve_start_time = 0
         self.best_move = None
+        self.pondering = False
+        self.ponder_stop: threading.Event = None
+        self.ponder_thread: threading.Thread = None
+        # Set by lz-analyze: (color, seconds between reports) of the analysis
+        # to run until the next command arrives
+        self.analysis: Tuple[GO_COLOR, float] = None
 
         self._debug_mode: bool = debug_mode
         self.engine = engine
@@ -73,6 +82,20 @@ class GtpConnection:
             "gogui-rules_board": self.gogui_rules_board_cmd,
             "gogui-analyze_commands": self.gogui_analyze_cmd,
             "timelimit": self.timelimit_cmd,
+            "time_settings": self.time_settings_cmd,
+            "time_left": self.time_left_cmd,
+            "workers": self.workers_cmd,
+            "parallel_mode": self.parallel_mode_cmd,
+            "ponder": self.ponder_cmd,
+            "tree_backend": self.tree_backend_cmd,
+            "search_stats": self.search_stats_cmd,
+            "lz-analyze": self.lz_analyze_cmd,
+            "book": self.book_cmd,
+            "tree_size": self.tree_size_cmd,
+            "tree_memory": self.tree_memory_cmd,
+            "batch": self.batch_cmd,
+            "search_option": self.search_option_cmd,
+            "lz-genmove_analyze": self.lz_genmove_analyze_cmd,
             "solve": self.solve_cmd,
 
         }
@@ -87,6 +110,18 @@ class GtpConnection:
             "genmove": (1, "Usage: genmove {w,b}"),
             "play": (2, "Usage: play {b,w} MOVE"),
             "legal_moves": (1, "Usage: legal_moves {w,b}"),
+            "timelimit": (1, "Usage: timelimit SECONDS"),
+            "time_settings": (3, "Usage: time_settings MAIN_TIME BYO_YOMI_TIME BYO_YOMI_STONES"),
+            "time_left": (3, "Usage: time_left {w,b} TIME STONES"),
+            "workers": (1, "Usage: workers INT"),
+            "parallel_mode": (1, "Usage: parallel_mode {root,tree}"),
+            "ponder": (1, "Usage: ponder {on,off}"),
+            "tree_backend": (1, "Usage: tree_backend {node,pool}"),
+            "book": (1, "Usage: book {FILE,off}"),
+            "tree_size": (0, "Usage: tree_size"),
+            "tree_memory": (1, "Usage: tree_memory MEGABYTES"),
+            "batch": (2, "Usage: batch LEAVES PLAYOUTS"),
+            "search_option": (2, "Usage: search_option {copy_free,bitboard_rollouts,symmetry} {on,off}"),
         }
 
     def write(self, data: str) -> None:
@@ -100,10 +135,69 @@ class GtpConnection:
         Start a GTP connection. 
         This function continuously monitors standard input for commands.
         """
-        line = stdin.readline()
+        line = self.read_line()
         while line:
             self.get_cmd(line)
-            line = stdin.readline()
+            line = self.read_line()
+
+    def read_line(self) -> str:
+        """
+        Wait for the next command line. With pondering on, the engine
+        searches in a background thread until the line arrives.
+        """
+        if self.analysis is not None:
+            return self.read_line_analyzing()
+        if not self.pondering:
+            return stdin.readline()
+        self.start_ponder()
+        try:
+            return stdin.readline()
+        finally:
+            self.stop_ponder()
+
+    def read_line_analyzing(self) -> str:
+        """
+        Run the analysis requested by lz-analyze until the next command line
+        arrives, then end the lz-analyze response.
+        """
+        color, interval = self.analysis
+        self.analysis = None
+        stop = threading.Event()
+        self.engine.set_analysis(self.write_analysis, interval)
+        thread = threading.Thread(target=self.engine.analyze,
+                                  args=(self.board.copy(), color, stop), daemon=True)
+        thread.start()
+        try:
+            return stdin.readline()
+        finally:
+            stop.set()
+            thread.join()
+            self.engine.set_analysis(None, interval)
+            self.write("\n")
+            self.flush()
+
+    def write_analysis(self, line: str) -> None:
+        if line:
+            self.write(line + "\n")
+            self.flush()
+
+    def start_ponder(self) -> None:
+        terminal, winner = self.board.EndGame()
+        if terminal:
+            return
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(
+            target=self.engine.ponder,
+            args=(self.board.copy(), self.board.current_player, self.ponder_stop),
+            daemon=True)
+        self.ponder_thread.start()
+
+    def stop_ponder(self) -> None:
+        if self.ponder_thread is None:
+            return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
 
     def get_cmd(self, command: str) -> None:
         """
@@ -248,6 +342,8 @@ class GtpConnection:
                      "pstring/Board Size/gogui-rules_board_size\n"
                      "pstring/Rules GameID/gogui-rules_game_id\n"
                      "pstring/Show Board/gogui-rules_board\n"
+                     "string/Search Statistics/search_stats\n"
+                     "string/Tree Size/tree_size\n"
                      )
 
     def gogui_rules_game_id_cmd(self, args: List[str]) -> None:
@@ -319,40 +415,42 @@ class GtpConnection:
 
     def play_cmd(self, args: List[str]) -> None:
         """ We already implemented this function for Assignment 2 """
+        error, move = self.play_gtp_move(args[0], args[1])
+        if error is not None:
+            self.respond(error)
+        elif len(args) > 2 and args[2] == 'print_move':
+            self.respond(move)
+        else:
+            self.respond()
+
+    def play_gtp_move(self, board_color: str, board_move: str) -> Tuple[str, str]:
+        """
+        Play board_move for board_color and pass it on to the engine, for play,
+        genmove and lz-genmove_analyze. Returns (error, move): why the move
+        is illegal, or None and the move played as a lowercase vertex or "pass".
+        """
         try:
-            board_color = args[0].lower()
-            board_move = args[1]
-            if board_color not in ['b', 'w']:
-                self.respond('illegal move: "{} {}" wrong color'.format(board_color, board_move))
-                return
+            color_string = board_color.lower()
+            if color_string not in ['b', 'w']:
+                return 'illegal move: "{} {}" wrong color'.format(color_string, board_move), None
 
-            if args[1].lower() == 'pass':
-                self.board.play_move(PASS, color_to_int(board_color))
-                if len(args) > 2 and args[2] == 'print_move':
-                    self.respond('pass')
-                else:
-                    self.respond()    
-                return
+            if board_move.lower() == 'pass':
+                self.board.play_move(PASS, color_to_int(color_string))
+                return None, 'pass'
 
-            coord = move_to_coord(args[1], self.board.size)
+            coord = move_to_coord(board_move, self.board.size)
             move = coord_to_point(coord[0], coord[1], self.board.size)
             
-            color = color_to_int(board_color)
+            color = color_to_int(color_string)
             if not self.board.play_move(move, color):
-                self.respond('illegal move: "{} {}" occupied'.format(board_color, board_move))
-                return
-            else:
-                self.debug_msg(
-                    "Move: {}\nBoard:\n{}\n".format(board_move, self.board2d())
-                )
-            if len(args) > 2 and args[2] == 'print_move':
-                move_as_string = format_point(coord)
-                self.respond(move_as_string.lower())
-            else:
-                self.respond()
+                return 'illegal move: "{} {}" occupied'.format(color_string, board_move), None
+            self.debug_msg(
+                "Move: {}\nBoard:\n{}\n".format(board_move, self.board2d())
+            )
             self.engine.update(self.board, format_point(coord))
+            return None, format_point(coord).lower()
         except Exception as e:
-            self.respond('illegal move: "{} {}" {}'.format(args[0], args[1], str(e)))
+            return 'illegal move: "{} {}" {}'.format(board_color, board_move, str(e)), None
 
     def gogui_rules_captured_count_cmd(self, args: List[str]) -> None:
         """ We already implemented this function for Assignment 2 """
@@ -366,14 +464,238 @@ class GtpConnection:
         if board_color not in {"b", "w"}:
             self.respond("invalid color")
             return
+        if self.board.EndGame()[0]:
+            self.error("game is over")
+            return
         color = color_to_int(board_color)
         self.play_cmd([board_color, self.engine.get_move(self.board, color), 'print_move'])
     
     def timelimit_cmd(self, args: List[str]) -> None:
         """ Implement this function for Assignment 2 """
-        self.engine.set_time_limit(int(args[0]))
+        try:
+            time_limit = float(args[0])
+        except ValueError:
+            self.error("Usage: timelimit SECONDS")
+            return
+        if time_limit <= 0:
+            self.error("time limit must be positive")
+            return
+        self.engine.set_time_limit(time_limit)
+        self.respond()
+
+    def time_settings_cmd(self, args: List[str]) -> None:
+        """ GTP time_settings: main time and Canadian byo-yomi, in seconds """
+        try:
+            main_time = float(args[0])
+            byo_yomi_time = float(args[1])
+            byo_yomi_stones = int(args[2])
+        except ValueError:
+            self.error("Usage: time_settings MAIN_TIME BYO_YOMI_TIME BYO_YOMI_STONES")
+            return
+        if main_time < 0 or byo_yomi_time < 0 or byo_yomi_stones < 0:
+            self.error("time settings must not be negative")
+            return
+        self.engine.set_time_settings(main_time, byo_yomi_time, byo_yomi_stones)
         self.respond()
 
+    def time_left_cmd(self, args: List[str]) -> None:
+        """ GTP time_left: time and stones left in the current period for a color """
+        board_color = args[0].lower()
+        if board_color not in {"b", "w"}:
+            self.error("invalid color")
+            return
+        try:
+            seconds = float(args[1])
+            stones = int(args[2])
+        except ValueError:
+            self.error("Usage: time_left {w,b} TIME STONES")
+            return
+        self.engine.set_time_left(color_to_int(board_color), seconds, stones)
+        self.respond()
+
+    def workers_cmd(self, args: List[str]) -> None:
+        """ Set the number of root-parallel search processes """
+        try:
+            workers = int(args[0])
+        except ValueError:
+            self.error("Usage: workers INT")
+            return
+        if workers < 1:
+            self.error("number of workers must be at least 1")
+            return
+        self.engine.set_workers(workers)
+        self.respond()
+
+    def parallel_mode_cmd(self, args: List[str]) -> None:
+        """ Choose root or tree parallelism for workers > 1 """
+        mode = args[0].lower()
+        if mode not in ("root", "tree"):
+            self.error("Usage: parallel_mode {root,tree}")
+            return
+        self.engine.set_parallel_mode(mode)
+        self.respond()
+
+    def ponder_cmd(self, args: List[str]) -> None:
+        """ Turn searching during the opponent's turn on or off """
+        mode = args[0].lower()
+        if mode not in ("on", "off"):
+            self.error("Usage: ponder {on,off}")
+            return
+        self.pondering = mode == "on"
+        self.respond()
+
+    def tree_backend_cmd(self, args: List[str]) -> None:
+        """ Choose CustomTreeNode objects or a NodePool for the search tree """
+        backend = args[0].lower()
+        if backend not in ("node", "pool"):
+            self.error("Usage: tree_backend {node,pool}")
+            return
+        self.engine.set_tree_backend(backend)
+        self.respond()
+
+    def tree_size_cmd(self, args: List[str]) -> None:
+        """ Nodes and estimated bytes of the search tree """
+        size = self.engine.get_tree_size()
+        if size is None:
+            self.error("tree size is only known for a single process search")
+            return
+        self.respond("nodes {} bytes {}".format(size[0], size[1]))
+
+    def tree_memory_cmd(self, args: List[str]) -> None:
+        """ Memory budget of the search tree; low-visit subtrees are pruned to stay under it """
+        try:
+            megabytes = float(args[0])
+        except ValueError:
+            self.error("Usage: tree_memory MEGABYTES")
+            return
+        if megabytes <= 0:
+            self.error("tree memory must be positive")
+            return
+        self.engine.set_tree_budget(int(megabytes * (1 << 20)))
+        self.respond()
+
+    def batch_cmd(self, args: List[str]) -> None:
+        """ Leaves selected per search step and rollouts per leaf, evaluated in one batch """
+        try:
+            leaves, playouts = int(args[0]), int(args[1])
+        except ValueError:
+            self.error("Usage: batch LEAVES PLAYOUTS")
+            return
+        if leaves < 1 or playouts < 1:
+            self.error("batch sizes must be positive")
+            return
+        self.engine.set_batch(leaves, playouts)
+        self.respond()
+
+    def search_option_cmd(self, args: List[str]) -> None:
+        """ Switch an implementation choice of the single process search """
+        name, mode = args[0].lower(), args[1].lower()
+        if name not in ("copy_free", "bitboard_rollouts", "symmetry") or mode not in ("on", "off"):
+            self.error("Usage: search_option {copy_free,bitboard_rollouts,symmetry} {on,off}")
+            return
+        self.engine.set_search_option(name, mode == "on")
+        self.respond()
+
+    def book_cmd(self, args: List[str]) -> None:
+        """ Play from the opening book FILE, or without a book """
+        if args[0].lower() == "off":
+            self.engine.set_book(None)
+        else:
+            try:
+                self.engine.set_book(args[0])
+            except ValueError as e:
+                self.error(str(e))
+                return
+        self.respond()
+
+    def search_stats_cmd(self, args: List[str]) -> None:
+        """
+        search_stats {on,off}: switch the search instrumentation.
+        search_stats: statistics of the last genmove search.
+        """
+        if len(args) > 1 or (args and args[0].lower() not in ("on", "off")):
+            self.error("Usage: search_stats [on|off]")
+            return
+        if args:
+            self.engine.set_search_stats(args[0].lower() == "on")
+            self.respond()
+            return
+        report = self.engine.get_search_stats()
+        if report is None:
+            self.error("no search statistics, switch them on with search_stats on")
+            return
+        self.respond(report)
+
+    def parse_analyze_args(self, args: List[str]) -> Tuple[GO_COLOR, float]:
+        """
+        Arguments of lz-analyze and lz-genmove_analyze: [color] [[interval] CENTISECONDS].
+        Returns (color, seconds between reports), or None if they are invalid.
+        """
+        color = self.board.current_player
+        interval = ANALYSIS_INTERVAL
+        i = 0
+        while i < len(args):
+            arg = args[i].lower()
+            if arg in ("b", "w", "black", "white"):
+                color = color_to_int(arg[0])
+            else:
+                if arg == "interval" and i + 1 < len(args):
+                    i += 1
+                    arg = args[i]
+                try:
+                    interval = int(arg) / 100
+                except ValueError:
+                    return None
+                if interval <= 0:
+                    return None
+            i += 1
+        return color, interval
+
+    def lz_analyze_cmd(self, args: List[str]) -> None:
+        """
+        lz-analyze [color] [interval]: search without playing and stream
+        info lines every interval centiseconds until the next command.
+        """
+        analysis = self.parse_analyze_args(args)
+        if analysis is None:
+            self.error("Usage: lz-analyze [{w,b}] [interval CENTISECONDS]")
+            return
+        terminal, winner = self.board.EndGame()
+        if terminal:
+            self.error("game is over")
+            return
+        self.analysis = analysis
+        self.write("=\n")
+        self.flush()
+
+    def lz_genmove_analyze_cmd(self, args: List[str]) -> None:
+        """
+        lz-genmove_analyze color [interval]: genmove that streams info lines
+        while it searches and ends with "play MOVE".
+        """
+        analysis = self.parse_analyze_args(args)
+        if not args or args[0].lower() not in ("b", "w", "black", "white") or analysis is None:
+            self.error("Usage: lz-genmove_analyze {w,b} [interval CENTISECONDS]")
+            return
+        color, interval = analysis
+        if self.board.EndGame()[0]:
+            self.error("game is over")
+            return
+        self.write("=\n")
+        self.flush()
+        self.engine.set_analysis(self.write_analysis, interval)
+        try:
+            move = self.engine.get_move(self.board, color)
+        finally:
+            self.engine.set_analysis(None, interval)
+        # Played as genmove plays it; an illegal move ends the response instead of "play"
+        error, move = self.play_gtp_move("b" if color == BLACK else "w", move)
+        if error is not None:
+            self.write("{}\n\n".format(error))
+        else:
+            self.write("play {}\n\n".format(move))
+        self.flush()
+
     def solve_cmd(self, args: List[str]) -> None:
         """ Implement this function for Assignment 2 """
         winner, winning_move = self.engine.solve_board(self.board)
@@ -389,12 +711,14 @@ def point_to_coord(point: GO_POINT, boardsize: int) -> Tuple[int, int]:
     Transform point given as board array index 
     to (row, col) coordinate representation.
     Special case: PASS is transformed to (PASS,PASS)
+    Raises ValueError for a point outside the board array, such as NO_POINT
     """
     if point == PASS:
         return (PASS, PASS)
-    else:
-        NS = boardsize + 1
-        return divmod(point, NS)
+    coords = get_geometry(boardsize).coords
+    if not 0 <= point < len(coords):
+        raise ValueError("point out of range")
+    return coords[point]
 
 
 def format_point(move: Tuple[int, int]) -> str:
@@ -402,13 +726,12 @@ def format_point(move: Tuple[int, int]) -> str:
     Return move coordinates as a string such as 'A1', or 'PASS'.
     """
     assert MAXSIZE <= 25
-    column_letters = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
     if move[0] == PASS:
         return "PASS"
     row, col = move
     if not 0 <= row < MAXSIZE or not 0 <= col < MAXSIZE:
         raise ValueError
-    return column_letters[col - 1] + str(row)
+    return COORD_STRINGS[row][col]
 
 
 def move_to_coord(point_str: str, board_size: int) -> Tuple[int, int]:
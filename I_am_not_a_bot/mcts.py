@@ -4,30 +4,75 @@ from board_util import GoBoardUtil
 from gtp_connection import point_to_coord, format_point
 import numpy as np
 import os, sys
-from typing import Dict, Tuple
+from typing import Callable, Dict, List, Tuple
+import threading
 import time
 from math import sqrt, log
-from random import choice
-from tree import CustomTreeNode
+from tree import CustomTreeNode, backup, backup_many, solve_path, node_ids, NODE_BYTES
+from bitboard import BitBoard
+from transposition import TranspositionTable, DEFAULT_TABLE_SIZE
+from batch_rollout import get_batch_rollout
+from search_stats import SearchStats
+from symmetry import get_symmetry
+from analysis import analysis_line, reporting_clock, ANALYSIS_INTERVAL, ANALYSIS_MOVES
+from time_manager import top_two, decided, STOP_CHECK_INTERVAL
+
+"""
+Default memory budget of the tree. When the estimated size goes over it,
+low-visit subtrees are collapsed until the tree is down to PRUNE_FRACTION of it.
+"""
+DEFAULT_TREE_BYTES: int = 1 << 30
+PRUNE_FRACTION: float = 0.5
 
 class CustomMCTS:
-    def __init__(self) -> None:
+    def __init__(self, table_size: int = DEFAULT_TABLE_SIZE, copy_free: bool = True,
+                 bitboard_rollouts: bool = True, batch_leaves: int = 1, batch_playouts: int = 1) -> None:
         self.root: 'CustomTreeNode' = CustomTreeNode(BLACK)
-        self.root.set_parent(self.root)
+        # Nodes in the tree, kept up to date by expand, transpose and prune
+        self.n_nodes: int = 1
+        self.max_nodes: int = DEFAULT_TREE_BYTES // NODE_BYTES
+        # The board's move history at the root position (see reuse_tree)
+        self.root_moves: List[GO_POINT] = []
         self.toplay: GO_COLOR = BLACK
+        self.table: TranspositionTable = TranspositionTable(table_size)
+        # Search on the caller's board and roll back with undo_move,
+        # instead of copying the board for every simulation.
+        self.copy_free: bool = copy_free
+        # Play rollouts on a BitBoard built from the leaf position.
+        self.bitboard_rollouts: bool = bitboard_rollouts
+        # With either above 1, each search step selects batch_leaves leaves and
+        # evaluates each with batch_playouts rollouts in one BatchRollout call.
+        self.batch_leaves: int = batch_leaves
+        self.batch_playouts: int = batch_playouts
+        self.rng: np.random.Generator = np.random.default_rng()
+        # Stop get_move before the time limit once the best move is decided.
+        self.early_stop: bool = True
+        # Keep one root child of every class of symmetric moves.
+        self.symmetry: bool = True
+        # Phase timers and tree statistics, None when switched off (see set_stats).
+        self.stats: SearchStats = None
+        # Receives an analysis_line every analysis_interval seconds of
+        # get_move and analyze, None when off (see set_analysis).
+        self.analysis_output: Callable[[str], None] = None
+        self.analysis_interval: float = ANALYSIS_INTERVAL
+        self.analysis_moves: int = ANALYSIS_MOVES
+        self.exploration: float = 0.6
+        self.heuristic_weight: float = 1
 
-    def backpropagate(self, node: 'CustomTreeNode', winner: GO_COLOR) -> None:
-        while node != self.root:
-            node.update(winner)
-            node = node.parent
+    def backpropagate(self, path: List['CustomTreeNode'], winner: GO_COLOR) -> None:
+        """
+        Add the result of one playout to every node on the descent path.
+        """
+        backup(path, winner)
 
-    def expand(self, node: 'CustomTreeNode', board: GoBoard) -> None:
-        moves = board.get_legal_moves(node.color)
-        for move in moves:
-            if move not in node.children:
-                new_node = CustomTreeNode(get_opponent(node.color))
-                new_node.set_parent(node)
-                node.children[move] = new_node
+    def expand(self, node: 'CustomTreeNode', board: GoBoard, color: GO_COLOR) -> None:
+        if self.stats is None:
+            node.expdf(board, color)
+        else:
+            start = time.perf_counter()
+            node.expdf(board, color)
+            self.stats.add_expansion(len(node.children), time.perf_counter() - start)
+        self.n_nodes += len(node.children)
 
     def best_move(self) -> GO_POINT:
         best_win_ratio = -1.0
@@ -39,57 +84,398 @@ class CustomMCTS:
                 best_move = move
         return best_move
     
-    def rollout(self, board: GoBoard, color: GO_COLOR) -> GO_COLOR:
+    @staticmethod
+    def rollout(board: GoBoard, color: GO_COLOR) -> GO_COLOR:
         while True:
             terminal, winner = board.EndGame()
             if terminal:
                 return winner   
-            moves: np.ndarray[GO_POINT] = board.get_empty_points()
-            move = choice(moves)
+            move = board.random_empty_point()
             board.play_move(move, board.current_player)
     
     def get_move(self,board: GoBoard,color: GO_COLOR,time_limit: int,exp: float,hw: float) -> GO_POINT:
         self.solve_start_time = time.time()
-        if self.toplay != color:
-            sys.stderr.write("Tree is for the wrong color to play. Deleting.\n")
-            sys.stderr.flush()
-            self.toplay = color
-            self.root = CustomTreeNode(color)
+        self.reuse_tree(board, color)
         self.exploration = exp
         self.heuristic_weight = hw
-        if not self.root.exp:
-            self.root.expdf(board, color)
-        while time.time() - self.solve_start_time < (time_limit - 0.03):
-            copied_board = board.copy()
-            self.search(copied_board, color)
+        deadline = self.solve_start_time + time_limit - 0.03
+        if self.stats is not None:
+            self.stats.reset()
+        self.run_search(board, color, self.with_analysis(self.search_clock(deadline), board))
+        self.report_analysis(board)
+        if self.stats is not None:
+            self.stats.search_time = time.time() - self.solve_start_time
 
+        if self.root.proven is not None:
+            best_move, best_child = self.root.proven_child()
+            if best_child is not None:
+                return best_move
         best_move, best_child = self.root.select_best_child()
         return best_move
-    def search(self, board: GoBoard, color: GO_COLOR) -> None:
+
+    def search_clock(self, deadline: float) -> Callable[[], bool]:
+        """
+        keep_going for run_search: true until deadline, or with early_stop
+        until the most visited root child can no longer be overtaken.
+        """
+        start = time.time()
+        start_visits = self.root.n_visits
+        calls = 0
+
+        def keep_going() -> bool:
+            nonlocal calls
+            now = time.time()
+            if now >= deadline:
+                return False
+            calls += 1
+            if self.early_stop and calls % STOP_CHECK_INTERVAL == 0:
+                children = self.root.children
+                if len(children) == 1:
+                    return False
+                best, second = top_two(child.n_visits for child in children.values())
+                return not decided(best, second, self.root.n_visits - start_visits, now - start, deadline - now)
+            return True
+        return keep_going
+
+    def run_search(self, board: GoBoard, color: GO_COLOR, keep_going: Callable[[], bool]) -> None:
+        """
+        Run simulations from the root for color to play on board while keep_going()
+        is true and the root is not proven.
+        """
+        # board.hash is for board.current_player to move; key the root for color
+        z = board.zobrist
+        self.table.put(board.hash ^ z.to_play[board.current_player] ^ z.to_play[color], self.root)
+        if not self.root.exp:
+            self.expand(self.root, board, color)
+        if self.symmetry:
+            self.merge_symmetric_children(board)
+        search = self.search
+        if self.batch_leaves > 1 or self.batch_playouts > 1:
+            search = self.search_batch
+        if self.copy_free and board.current_player == color:
+            n_moves = len(board.move_history)
+            try:
+                while self.root.proven is None and keep_going():
+                    search(board, color)
+                    board.undo_to(n_moves)
+                    if self.n_nodes > self.max_nodes:
+                        self.prune()
+            finally:
+                board.undo_to(n_moves)
+        else:
+            while self.root.proven is None and keep_going():
+                copied_board = board.copy()
+                search(copied_board, color)
+                if self.n_nodes > self.max_nodes:
+                    self.prune()
+
+    def merge_symmetric_children(self, board: GoBoard) -> None:
+        """
+        If the root position (board) maps to itself under some symmetries,
+        remove the root children whose moves are symmetric to a smaller move,
+        adding their statistics to that move's child.
+        """
+        children = self.root.children
+        if len(children) < 2:
+            return
+        moves = np.array(list(children))
+        smallest = get_symmetry(board.size).smallest_images(board, moves)
+        merged = False
+        for move, image in zip(moves.tolist(), smallest.tolist()):
+            if image != move and image in children:
+                child = children.pop(move)
+                self.root.priors.pop(move, None)
+                kept = children[image]
+                kept.n_visits += child.n_visits
+                kept.n_opponent_wins += child.n_opponent_wins
+                merged = True
+        if merged:
+            # Free the merged subtrees and their table entries
+            self.release()
+
+    def prune(self) -> None:
+        """
+        Collapse the subtrees of the nodes with the fewest visits until the
+        tree has at most PRUNE_FRACTION * max_nodes nodes. The collapsed nodes
+        keep their statistics and are expanded again if the search returns.
+        """
+        target = int(self.max_nodes * PRUNE_FRACTION)
+        while True:
+            # Collapsing every node below a visit threshold frees about the sum
+            # of their child counts. Only about: a transposed node is shared by
+            # several parents and can have more visits than each of them, and
+            # it stays in the tree while one parent keeps it. So the passes are
+            # repeated until the recount is under the target.
+            visits = []
+            sizes = []
+            seen = {id(self.root)}
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                if node is not self.root and node.children:
+                    visits.append(node.n_visits)
+                    sizes.append(len(node.children))
+                for child in node.children.values():
+                    if id(child) not in seen:
+                        seen.add(id(child))
+                        stack.append(child)
+            self.n_nodes = len(seen)
+            if not visits or self.n_nodes <= target:
+                break
+            order = np.argsort(visits, kind="stable")
+            freed = np.cumsum(np.array(sizes)[order])
+            excess = self.n_nodes - target
+            k = min(int(np.searchsorted(freed, excess)), len(order) - 1)
+            threshold = visits[order[k]]
+            seen = {id(self.root)}
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                for child in node.children.values():
+                    if child.n_visits <= threshold:
+                        child.collapse()
+                    elif id(child) not in seen:
+                        seen.add(id(child))
+                        stack.append(child)
+        self.release()
+
+    def ponder(self, board: GoBoard, color: GO_COLOR, stop: threading.Event) -> None:
+        """
+        Keep growing the tree for color to play on board until stop is set.
+        Runs in a background thread while the opponent is thinking; the next
+        update_with_move or get_move picks up the grown subtree.
+        """
+        self.reuse_tree(board, color)
+        self.run_search(board, color, lambda: not stop.is_set())
+
+    def analyze(self, board: GoBoard, color: GO_COLOR, stop: threading.Event) -> None:
+        """
+        Search for color to play on board until stop is set, sending analysis
+        lines to analysis_output.
+        """
+        self.reuse_tree(board, color)
+        self.run_search(board, color, self.with_analysis(lambda: not stop.is_set(), board))
+        self.report_analysis(board)
+
+    def with_analysis(self, keep_going: Callable[[], bool], board: GoBoard) -> Callable[[], bool]:
+        """
+        keep_going, reporting the root children to analysis_output if it is set.
+        run_search calls keep_going with board at the root position.
+        """
+        if self.analysis_output is None:
+            return keep_going
+        output = self.analysis_output
+        max_moves = self.analysis_moves
+        return reporting_clock(keep_going, lambda: output(analysis_line(self.root, board, max_moves)),
+                               self.analysis_interval, time.time)
+
+    def report_analysis(self, board: GoBoard) -> None:
+        """
+        The last report of a search to analysis_output, if it is set, sent once
+        the search has stopped: on time, or early because the root is proven.
+        """
+        if self.analysis_output is not None:
+            self.analysis_output(analysis_line(self.root, board, self.analysis_moves))
+
+    def descend(self, board: GoBoard, color: GO_COLOR) -> Tuple[List['CustomTreeNode'], GO_COLOR]:
+        """
+        Select a path from the root to a leaf, playing its moves on board,
+        and expand the leaf, or prove it if the game is over there.
+        Returns the path and the color to play at the leaf.
+        With stats on, the phases and the shape of the tree are recorded in self.stats.
+        """
+        stats = self.stats
+        clock = time.perf_counter
         node = self.root
+        path = [node]
         if not node.exp:
-            node.expdf(board, color)
+            self.expand(node, board, color)
         while not node.is_leaf():
+            if stats is not None:
+                start = clock()
             move, next_node = node.select_in_tree(self.exploration, self.heuristic_weight, board)
-            x = board.play_move(move, color)
+            if next_node is None:
+                # A child is won, or all were proven through transpositions
+                node.solve()
+                break
+            if stats is not None:
+                selected = clock()
+            board.play_move(move, color)
+            if stats is not None:
+                stats.add_time("select", selected - start)
+                stats.add_time("play", clock() - selected)
             color = get_opponent(color)
+            if next_node.n_visits == 0:
+                shared = self.transpose(node, move, next_node, board)
+                if stats is not None and shared is not next_node:
+                    stats.transpositions += 1
+                next_node = shared
             node = next_node
-        if not node.exp:
-            node.expdf(board, color)
-        
-        winner = self.rollout(board, color)
-        node.update(winner)
+            path.append(node)
+        if not node.exp and node.proven is None:
+            terminal, winner = board.EndGame()
+            if terminal:
+                node.proven = winner
+            else:
+                self.expand(node, board, color)
+        if stats is not None:
+            stats.add_depth(len(path) - 1)
+        return path, color
+
+    def search(self, board: GoBoard, color: GO_COLOR) -> None:
+        stats = self.stats
+        clock = time.perf_counter
+        path, color = self.descend(board, color)
+        proven = path[-1].proven
+        if proven is not None:
+            winner = proven
+            if stats is not None:
+                stats.proven += 1
+        else:
+            rollout_board = BitBoard.for_rollout(board) if self.bitboard_rollouts else board
+            if stats is None:
+                winner = self.rollout(rollout_board, color)
+            else:
+                start = clock()
+                n_moves = rollout_board.depth
+                winner = self.rollout(rollout_board, color)
+                stats.rollout_moves += rollout_board.depth - n_moves
+                stats.add_time("rollout", clock() - start)
+        if stats is not None:
+            start = clock()
+        backup(path, winner)
+        if proven is not None:
+            solve_path(path)
+        if stats is not None:
+            stats.add_time("backup", clock() - start)
+
+    def search_batch(self, board: GoBoard, color: GO_COLOR) -> None:
+        """
+        Select batch_leaves leaves, one after another with virtual loss on their paths,
+        then evaluate all of them with batch_playouts rollouts each in one batch.
+        board is left at one of the leaves; the caller rolls it back.
+        """
+        n_moves = len(board.move_history)
+        k = self.batch_playouts
+        batch = get_batch_rollout(board.size)
+        paths = []
+        proven = []
+        leaves = []
+        colors = []
+        for i in range(self.batch_leaves):
+            if i > 0:
+                board.undo_to(n_moves)
+            path, leaf_color = self.descend(board, color)
+            for node in path:
+                node.add_virtual_loss(k)
+            paths.append(path)
+            # Proven leaves are backed up with their winner, without rollouts
+            proven.append(path[-1].proven)
+            if path[-1].proven is None:
+                leaves.append(batch.position(board))
+                colors.append(leaf_color)
+        winners = iter(batch.run_many(leaves, colors, k, self.rng) if leaves else [])
+        for path, winner in zip(paths, proven):
+            for node in path:
+                node.remove_virtual_loss(k)
+            if winner is None:
+                backup_many(path, next(winners))
+            else:
+                backup_many(path, np.full(k, winner))
+                solve_path(path)
+
+    def transpose(self, parent: 'CustomTreeNode', move: GO_POINT, node: 'CustomTreeNode', board: GoBoard) -> 'CustomTreeNode':
+        """
+        Called when the search first enters node, with board at its position.
+        If the position is already in the tree through another move order,
+        link that node in as the child of parent so both paths share its statistics.
+        Otherwise register node in the transposition table.
+        """
+        shared = self.table.get(board.hash)
+        if shared is not None and shared is not node and shared.color == node.color:
+            parent.children[move] = shared
+            self.n_nodes -= 1
+            return shared
+        self.table.put(board.hash, node)
+        return node
     def update_with_move(self, last_move: GO_POINT) -> None:
-        if last_move in self.root.children:
-            self.root = self.root.children[last_move]
+        """
+        Make the child of last_move the root if the tree is for the player who
+        made it, and free the rest of the tree. Otherwise the tree is kept
+        as it is, and the next search finds its position with reuse_tree.
+        """
+        mover = self.toplay
+        self.toplay = get_opponent(mover)
+        child = self.root.children.get(last_move)
+        if child is None or self.root.color != mover:
+            return
+        self.root = child
+        self.root_moves.append(last_move)
+        self.release()
+
+    def reuse_tree(self, board: GoBoard, color: GO_COLOR) -> None:
+        """
+        Make the root the node of board with color to play, keeping what the
+        tree knows about the position. The node is found by following the
+        moves played on board since the root position, any number of them,
+        or else by the position's hash in the transposition table. A new
+        tree is started only if neither finds it. With stats on, the visits
+        kept are reported on stderr.
+        """
+        history = board.move_history
+        if history == self.root_moves and self.root.color == color:
+            found = "root"
+            node = self.root
         else:
-            self.root = CustomTreeNode(get_opponent(self.toplay))
-        self.root.parent = self.root
-        self.toplay = get_opponent(self.toplay)
-    
+            found = "moves"
+            node = self.root
+            n = len(self.root_moves)
+            if history[:n] != self.root_moves:
+                node = None
+            for move in history[n:]:
+                if node is None:
+                    break
+                node = node.children.get(move)
+            if node is None or node.color != color:
+                found = "hash"
+                z = board.zobrist
+                node = self.table.get(board.hash ^ z.to_play[board.current_player] ^ z.to_play[color])
+                if node is not None and node.color != color:
+                    node = None
+        previous = self.root.n_visits
+        self.toplay = color
+        if node is None:
+            self.reset_tree()
+        elif node is not self.root:
+            self.root = node
+            self.release()
+        self.root_moves = list(history)
+        if self.stats is not None:
+            sys.stderr.write("Tree reuse: kept {} of {} visits ({})\n".format(
+                self.root.n_visits, previous, found if node is not None else "new tree"))
+            sys.stderr.flush()
+
+    def release(self) -> None:
+        """
+        Drop the transposition table entries of nodes that are no longer in the tree,
+        so that they are freed, and recount the nodes.
+        """
+        ids = node_ids(self.root)
+        self.table.retain(ids)
+        self.n_nodes = len(ids)
+
+    def reset(self) -> None:
+        """
+        Forget the tree and start over for a new game, black to play.
+        """
+        self.toplay = BLACK
+        self.reset_tree()
+
     def reset_tree(self) -> None:
         self.root = CustomTreeNode(self.toplay)
-        self.root.set_parent(self.root)
+        self.table.clear()
+        self.n_nodes = 1
+        self.root_moves = []
 
     def get_toplay(self) -> GO_COLOR:
         return self.toplay
@@ -108,3 +494,48 @@ class CustomMCTS:
 
     def set_heuristic_weight(self, heuristic_weight: float) -> None:
         self.heuristic_weight = heuristic_weight
+
+    def set_copy_free(self, copy_free: bool) -> None:
+        self.copy_free = copy_free
+
+    def set_bitboard_rollouts(self, bitboard_rollouts: bool) -> None:
+        self.bitboard_rollouts = bitboard_rollouts
+
+    def set_symmetry(self, symmetry: bool) -> None:
+        self.symmetry = symmetry
+
+    def set_tree_budget(self, max_bytes: int) -> None:
+        """
+        Keep the estimated size of the tree under max_bytes.
+        """
+        self.max_nodes = max(max_bytes // NODE_BYTES, 1)
+
+    def tree_size(self) -> Tuple[int, int]:
+        """
+        (nodes, estimated bytes) of the tree.
+        """
+        return self.n_nodes, self.n_nodes * NODE_BYTES
+
+    def set_stats(self, on: bool) -> None:
+        """
+        Switch the search instrumentation on or off. The statistics are
+        reset at the start of every get_move.
+        """
+        if not on:
+            self.stats = None
+        elif self.stats is None:
+            self.stats = SearchStats()
+
+    def set_analysis(self, output: Callable[[str], None], interval: float = ANALYSIS_INTERVAL,
+                     max_moves: int = ANALYSIS_MOVES) -> None:
+        """
+        Send an analysis line to output every interval seconds while searching; output None stops it.
+        """
+        self.analysis_output = output
+        self.analysis_interval = interval
+        self.analysis_moves = max_moves
+
+    def set_batch(self, batch_leaves: int, batch_playouts: int) -> None:
+        assert batch_leaves >= 1 and batch_playouts >= 1
+        self.batch_leaves = batch_leaves
+        self.batch_playouts = batch_playouts
@@ -0,0 +1,260 @@
+"""
+micro_benchmark.py
+Timings of single board primitives on fixed positions.
+
+Positions are random games from a fixed seed, stopped when a given
+fraction of the points holds stones. Every primitive is timed on each
+position in a number of samples of many calls, and the per-call median,
+mean, standard deviation and minimum are reported. Primitives that change
+the board are timed in play/undo pairs, with the half that is not being
+measured done outside the timed region, so every sample starts from the
+same position.
+
+    python micro_benchmark.py --output micro.json
+    python micro_benchmark.py --board bitboard --baseline micro.json
+
+--board selects the backend (GoBoard or BitBoard built from the same
+positions); primitives a backend does not have are skipped. --baseline
+prints the ratio of each median to the one stored in a previous output file.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from board import GoBoard
+from bitboard import BitBoard
+
+MICRO_SIZES: List[int] = [7, 9, 13, 19]
+MICRO_DENSITIES: List[float] = [0.1, 0.3, 0.5]
+MICRO_SEED: int = 455
+SAMPLES: int = 7
+CALLS: int = 16
+
+
+def micro_position(size: int, density: float, seed: int = MICRO_SEED) -> GoBoard:
+    """
+    A non-terminal position of a seeded random game with about density * size * size stones.
+    """
+    rng = random.Random(seed * 1000 + size * 10 + int(density * 10))
+    target = int(density * size * size)
+    while True:
+        board = GoBoard(size)
+        while size * size - board.n_empty < target and not board.EndGame()[0]:
+            move = rng.choice(sorted(board.get_empty_points().tolist()))
+            board.play_move(move, board.current_player)
+        if not board.EndGame()[0]:
+            return board
+
+
+def _moves(board, n: int) -> List[int]:
+    return sorted(board.get_empty_points().tolist())[:n]
+
+
+def time_play_move(board, n: int) -> float:
+    moves = _moves(board, n)
+    n_moves = len(board.move_history)
+    start = time.perf_counter()
+    for move in moves:
+        board.play_move(move, board.current_player)
+    elapsed = time.perf_counter() - start
+    board.undo_to(n_moves)
+    return elapsed / len(moves)
+
+
+def time_undo_move(board, n: int) -> float:
+    moves = _moves(board, n)
+    for move in moves:
+        board.play_move(move, board.current_player)
+    start = time.perf_counter()
+    for _ in moves:
+        board.undo_move()
+    return (time.perf_counter() - start) / len(moves)
+
+
+def time_undo_to(board, n: int) -> float:
+    """ Per undone move """
+    moves = _moves(board, n)
+    n_moves = len(board.move_history)
+    for move in moves:
+        board.play_move(move, board.current_player)
+    start = time.perf_counter()
+    board.undo_to(n_moves)
+    return (time.perf_counter() - start) / len(moves)
+
+
+def time_play_rm(board, n: int) -> float:
+    moves = _moves(board, n)
+    color = board.current_player
+    start = time.perf_counter()
+    for move in moves:
+        board.play_rm(move, color)
+    elapsed = time.perf_counter() - start
+    for move in reversed(moves):
+        board.undo(move)
+    return elapsed / len(moves)
+
+
+def time_undo(board, n: int) -> float:
+    moves = _moves(board, n)
+    color = board.current_player
+    for move in moves:
+        board.play_rm(move, color)
+    start = time.perf_counter()
+    for move in reversed(moves):
+        board.undo(move)
+    return (time.perf_counter() - start) / len(moves)
+
+
+def _calls(function: Callable[[], object], n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        function()
+    return (time.perf_counter() - start) / n
+
+
+def time_copy(board, n: int) -> float:
+    return _calls(board.copy, n)
+
+
+def time_get_empty_points(board, n: int) -> float:
+    return _calls(board.get_empty_points, n)
+
+
+def time_end_game(board, n: int) -> float:
+    return _calls(board.EndGame, n)
+
+
+def time_state_to_str(board, n: int) -> float:
+    return _calls(board.state_to_str, n)
+
+
+def time_five_detect(board, n: int) -> float:
+    stones = board.move_history[-n:]
+    start = time.perf_counter()
+    for move in stones:
+        board.five_detect(move)
+    return (time.perf_counter() - start) / len(stones)
+
+
+def time_cc_heur(board, n: int) -> float:
+    """ With the threat map as the search leaves it: valid except around the last moves """
+    moves = _moves(board, n)
+    color = board.current_player
+    start = time.perf_counter()
+    for move in moves:
+        board.cc_heur(move, color)
+    return (time.perf_counter() - start) / len(moves)
+
+
+def time_hr(board, n: int) -> float:
+    moves = _moves(board, n)
+    color = board.current_player
+    start = time.perf_counter()
+    for move in moves:
+        board.hr(move, color)
+    return (time.perf_counter() - start) / len(moves)
+
+
+def time_move_r(board, n: int) -> float:
+    """ One call per sample, it tries every empty point """
+    return _calls(lambda: board.move_r(board.current_player), 1)
+
+
+"""
+(name, timing function, method the backend needs)
+"""
+PRIMITIVES = [
+    ("play_move", time_play_move, "play_move"),
+    ("undo_move", time_undo_move, "undo_move"),
+    ("undo_to", time_undo_to, "undo_to"),
+    ("play_rm", time_play_rm, "play_rm"),
+    ("undo", time_undo, "undo"),
+    ("copy", time_copy, "copy"),
+    ("get_empty_points", time_get_empty_points, "get_empty_points"),
+    ("EndGame", time_end_game, "EndGame"),
+    ("five_detect", time_five_detect, "five_detect"),
+    ("cc_heur", time_cc_heur, "cc_heur"),
+    ("hr", time_hr, "hr"),
+    ("move_r", time_move_r, "move_r"),
+    ("state_to_str", time_state_to_str, "state_to_str"),
+]
+
+BACKENDS: Dict[str, Callable[[GoBoard], object]] = {
+    "goboard": lambda board: board.copy(),
+    "bitboard": BitBoard.from_goboard,
+}
+
+
+def run_micro(backend: str, sizes: List[int], densities: List[float], samples: int,
+              calls: int, seed: int) -> Dict:
+    results = []
+    make_board = BACKENDS[backend]
+    print("{:5s} {:7s} {:16s} {:>10s} {:>10s} {:>10s}".format(
+        "size", "density", "primitive", "median us", "min us", "stdev us"))
+    for size in sizes:
+        for density in densities:
+            position = micro_position(size, density, seed)
+            for name, timer, method in PRIMITIVES:
+                board = make_board(position)
+                if not hasattr(board, method):
+                    continue
+                timer(board, calls)
+                times = [timer(board, calls) * 1e6 for _ in range(samples)]
+                result = {
+                    "size": size,
+                    "density": density,
+                    "primitive": name,
+                    "median_us": statistics.median(times),
+                    "mean_us": statistics.mean(times),
+                    "stdev_us": statistics.stdev(times) if samples > 1 else 0.0,
+                    "min_us": min(times),
+                    "samples": samples,
+                }
+                results.append(result)
+                print("{:5d} {:7.1f} {:16s} {:10.2f} {:10.2f} {:10.2f}".format(
+                    size, density, name, result["median_us"], result["min_us"], result["stdev_us"]))
+                sys.stdout.flush()
+    return {"backend": backend, "seed": seed, "results": results}
+
+
+def compare(current: Dict, baseline: Dict) -> None:
+    """
+    Print current median / baseline median for every timing in both.
+    """
+    base = {(r["size"], r["density"], r["primitive"]): r for r in baseline["results"]}
+    print("{} against {}".format(current["backend"], baseline["backend"]))
+    for result in current["results"]:
+        key = (result["size"], result["density"], result["primitive"])
+        if key in base:
+            print("{:5d} {:7.1f} {:16s} {:6.2f}x".format(
+                key[0], key[1], key[2], result["median_us"] / base[key]["median_us"]))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time board primitives on fixed positions.")
+    parser.add_argument("--board", choices=sorted(BACKENDS), default="goboard")
+    parser.add_argument("--sizes", type=int, nargs="+", default=MICRO_SIZES)
+    parser.add_argument("--densities", type=float, nargs="+", default=MICRO_DENSITIES)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--calls", type=int, default=CALLS, help="calls per sample")
+    parser.add_argument("--seed", type=int, default=MICRO_SEED)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="print ratios to the results in this JSON file")
+    args = parser.parse_args()
+
+    results = run_micro(args.board, args.sizes, args.densities, args.samples, args.calls, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+node_pool.py
+Struct-of-arrays storage for search tree nodes.
+
+Instead of one CustomTreeNode object per node, NodePool keeps every node
+field in its own preallocated numpy array, indexed by node id. The
+children of a node are created together by expand and occupy the
+contiguous id range child_start .. child_start + child_count, so UCT
+selection over them is a single vectorised argmax over array slices.
+
+Node fields (root of a fresh pool is node 0):
+    visits:     playouts through the node
+    wins:       wins of the player who moved into the node (draws count 1/2)
+    prior:      board.cc_heur value of move, NaN until computed
+    parent:     id of the parent node, -1 for the root
+    child_start, child_count: the node's children
+    vloss:      virtual losses of descents still in progress
+    move:       the move leading to the node
+    color:      the player to move at the node
+    state:      UNEXPANDED, EXPANDED or TERMINAL
+
+compact keeps the subtree of one node, moved to the front of the pool,
+and frees every other node.
+
+A pool either owns its memory and doubles it when full, or lives in a
+caller-provided buffer (e.g. shared memory) of fixed capacity.
+"""
+import numpy as np
+from typing import List, Tuple
+
+from board_base import opponent as get_opponent, EMPTY, GO_COLOR, GO_POINT
+from board import GoBoard
+
+UNEXPANDED = 0
+EXPANDED = 1
+TERMINAL = 2
+
+"""
+(name, dtype) of every node field, in the order they are laid out in the buffer.
+"""
+FIELDS: List[Tuple[str, type]] = [
+    ("visits", np.int64),
+    ("wins", np.float64),
+    ("prior", np.float64),
+    ("parent", np.int64),
+    ("child_start", np.int64),
+    ("vloss", np.int32),
+    ("move", np.int32),
+    ("child_count", np.int32),
+    ("color", np.int8),
+    ("state", np.int8),
+]
+
+NODE_BYTES: int = sum(np.dtype(dtype).itemsize for _, dtype in FIELDS)
+HEADER_BYTES: int = 8
+
+
+def pool_nbytes(capacity: int) -> int:
+    """
+    Size of the buffer that holds a pool of capacity nodes.
+    """
+    return HEADER_BYTES + capacity * NODE_BYTES
+
+
+class NodePool(object):
+    def __init__(self, capacity: int, buffer=None) -> None:
+        """
+        A pool for capacity nodes. Without a buffer the pool allocates its own
+        memory and grows on demand; with one it uses that buffer and cannot grow.
+        """
+        assert capacity >= 1
+        self.growable: bool = buffer is None
+        if buffer is None:
+            buffer = bytearray(pool_nbytes(capacity))
+        self._bind(capacity, buffer)
+
+    def _bind(self, capacity: int, buffer) -> None:
+        self.capacity: int = capacity
+        self.buffer = buffer
+        # header[0] is the number of allocated nodes
+        self.header: np.ndarray = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=0)
+        offset = HEADER_BYTES
+        for field, dtype in FIELDS:
+            setattr(self, field, np.ndarray((capacity,), dtype=dtype, buffer=buffer, offset=offset))
+            offset += capacity * np.dtype(dtype).itemsize
+
+    def _grow(self, needed: int) -> bool:
+        if not self.growable:
+            return False
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        old = {field: getattr(self, field) for field, _ in FIELDS}
+        size = self.size()
+        self._bind(capacity, bytearray(pool_nbytes(capacity)))
+        self.header[0] = size
+        for field, _ in FIELDS:
+            getattr(self, field)[:size] = old[field][:size]
+        return True
+
+    def size(self) -> int:
+        """
+        Number of allocated nodes.
+        """
+        return int(self.header[0])
+
+    def nbytes(self) -> int:
+        """
+        Bytes used by the allocated nodes.
+        """
+        return HEADER_BYTES + self.size() * NODE_BYTES
+
+    def reset(self, color: GO_COLOR) -> int:
+        """
+        Drop all nodes and create a single unexpanded root with color to play.
+        Returns the root id.
+        """
+        self.header[0] = 1
+        self.init_node(0, -1, -1, color)
+        return 0
+
+    def init_node(self, node: int, parent: int, move: GO_POINT, color: GO_COLOR) -> None:
+        self.visits[node] = 0
+        self.wins[node] = 0.0
+        self.prior[node] = np.nan
+        self.parent[node] = parent
+        self.child_start[node] = 0
+        self.child_count[node] = 0
+        self.vloss[node] = 0
+        self.move[node] = move
+        self.color[node] = color
+        self.state[node] = UNEXPANDED
+
+    def expand(self, node: int, moves: np.ndarray) -> bool:
+        """
+        Create one child of node per move, in one contiguous range.
+        Returns False if the pool is full and cannot grow.
+        """
+        start = self.size()
+        n = len(moves)
+        if start + n > self.capacity and not self._grow(start + n):
+            return False
+        end = start + n
+        self.visits[start:end] = 0
+        self.wins[start:end] = 0.0
+        self.prior[start:end] = np.nan
+        self.parent[start:end] = node
+        self.child_start[start:end] = 0
+        self.child_count[start:end] = 0
+        self.vloss[start:end] = 0
+        self.move[start:end] = moves
+        self.color[start:end] = get_opponent(self.color[node])
+        self.state[start:end] = UNEXPANDED
+        self.header[0] = end
+        self.child_start[node] = start
+        self.child_count[node] = n
+        self.state[node] = EXPANDED
+        return True
+
+    def select(self, node: int, board: GoBoard, exploration: float, heuristic_weight: float) -> int:
+        """
+        UCT selection over the children of node, the rule of CustomTreeNode.select_in_tree
+        as one argmax. Virtual losses count as visits without wins.
+        The first unvisited child is taken before any visited one. Priors are
+        computed with board (at node's position) the first time they are needed.
+        """
+        start = self.child_start[node]
+        end = start + self.child_count[node]
+        visits = self.visits[start:end] + self.vloss[start:end]
+        unvisited = np.flatnonzero(visits == 0)
+        if unvisited.size > 0:
+            return int(start + unvisited[0])
+        priors = self.prior[start:end]
+        for i in np.flatnonzero(np.isnan(priors)):
+            child = start + i
+            self.prior[child] = board.cc_heur(self.move[child], self.color[child])
+        parent_visits = self.visits[node] + self.vloss[node]
+        uct = (self.wins[start:end] / visits
+               + exploration * np.sqrt(np.log(parent_visits) / visits)
+               + heuristic_weight / (visits + 1) * priors)
+        return int(start + np.argmax(uct))
+
+    def backup(self, path: List[int], winner: GO_COLOR) -> None:
+        """
+        Add one playout result to every node on path.
+        """
+        nodes = np.array(path)
+        self.visits[nodes] += 1
+        if winner == EMPTY:
+            self.wins[nodes] += 0.5
+        else:
+            self.wins[nodes] += self.color[nodes] != winner
+
+    def find_child(self, node: int, move: GO_POINT) -> int:
+        """
+        Id of the child of node reached by move, or -1.
+        """
+        start = self.child_start[node]
+        found = np.flatnonzero(self.move[start:start + self.child_count[node]] == move)
+        if found.size == 0:
+            return -1
+        return int(start + found[0])
+
+    def best_child(self, node: int) -> int:
+        """
+        The most visited child of node, as CustomTreeNode.select_best_child.
+        """
+        start = self.child_start[node]
+        return int(start + np.argmax(self.visits[start:start + self.child_count[node]]))
+
+    def children(self, node: int) -> range:
+        start = int(self.child_start[node])
+        return range(start, start + int(self.child_count[node]))
+
+    def compact(self, root: int) -> int:
+        """
+        Keep only the subtree of root, moved to the front of the pool in
+        breadth-first order so that every child range stays contiguous, and
+        free all other nodes. Returns the new id of root, 0.
+        """
+        order = [root]
+        child_start = [0]
+        i = 0
+        while i < len(order):
+            node = order[i]
+            count = int(self.child_count[node])
+            if count > 0:
+                child_start[i] = len(order)
+                start = int(self.child_start[node])
+                order.extend(range(start, start + count))
+                child_start.extend([0] * count)
+            i += 1
+        n = len(order)
+        old_ids = np.array(order, dtype=np.int64)
+        new_ids = np.full(self.size(), -1, dtype=np.int64)
+        new_ids[old_ids] = np.arange(n)
+        for field, _ in FIELDS:
+            array = getattr(self, field)
+            array[:n] = array[old_ids]
+        self.child_start[:n] = child_start
+        self.parent[1:n] = new_ids[self.parent[1:n]]
+        self.parent[0] = -1
+        self.header[0] = n
+        return 0
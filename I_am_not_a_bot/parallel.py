@@ -0,0 +1,136 @@
+"""
+parallel.py
+Root-parallel MCTS over a pool of worker processes.
+
+Every worker keeps its own CustomMCTS and searches the same position with
+its own random seed for the same time limit. The root child visit and win
+counts of all workers are summed, and the move is chosen from the merged
+root with select_best_child as in the single process search. A child any
+worker proved keeps that value, a proven win taking precedence, so a
+worker's proof is not outvoted by the visits of the others.
+Workers are started once and reused for every move; moves played in the
+game are forwarded to them so each worker keeps reusing its own subtree.
+"""
+import multiprocessing as mp
+import random
+from multiprocessing.connection import Connection
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from board_base import opponent as get_opponent, BLACK, GO_COLOR, GO_POINT
+from board import GoBoard
+from mcts import CustomMCTS
+from tree import CustomTreeNode
+
+"""
+Time kept back from each worker's search for sending the position out
+and collecting the statistics.
+"""
+IPC_MARGIN: float = 0.05
+
+
+def _worker(conn: Connection, seed: int) -> None:
+    """
+    Worker process loop. Messages are tuples whose first element is the command.
+    """
+    random.seed(seed)
+    mcts = CustomMCTS()
+    mcts.rng = np.random.default_rng(seed)
+    while True:
+        message = conn.recv()
+        command = message[0]
+        if command == "search":
+            _, board, color, time_limit, exp, hw = message
+            mcts.get_move(board, color, time_limit, exp, hw)
+            stats = {move: (child.n_visits, child.n_opponent_wins, child.proven)
+                     for move, child in mcts.root.children.items()}
+            conn.send(stats)
+        elif command == "update":
+            mcts.update_with_move(message[1])
+        elif command == "reset":
+            mcts.reset()
+        elif command == "close":
+            break
+    conn.close()
+
+
+class RootParallelMCTS:
+    def __init__(self, n_workers: int, seed: int = None) -> None:
+        """
+        Start n_workers worker processes, each with its own CustomMCTS.
+        """
+        assert n_workers >= 1
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        self.n_workers: int = n_workers
+        self.root: CustomTreeNode = CustomTreeNode(BLACK)
+        self.toplay: GO_COLOR = BLACK
+        self.connections: List[Connection] = []
+        self.processes: List[mp.Process] = []
+        for i in range(n_workers):
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(target=_worker, args=(child_conn, seed + i), daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    def get_move(self, board: GoBoard, color: GO_COLOR, time_limit: float, exp: float, hw: float) -> GO_POINT:
+        worker_time = max(time_limit - IPC_MARGIN, 0.05)
+        for conn in self.connections:
+            conn.send(("search", board, color, worker_time, exp, hw))
+        merged: Dict[GO_POINT, Tuple[int, float, GO_COLOR]] = {}
+        for conn in self.connections:
+            for move, (visits, wins, proven) in conn.recv().items():
+                total_visits, total_wins, merged_proven = merged.get(move, (0, 0, None))
+                if merged_proven is None or proven == color:
+                    merged_proven = proven if proven is not None else merged_proven
+                merged[move] = (total_visits + visits, total_wins + wins, merged_proven)
+        self.toplay = color
+        self.root = self.merged_root(merged, color)
+        best_move, best_child = self.root.select_best_child()
+        return best_move
+
+    @staticmethod
+    def merged_root(merged: Dict[GO_POINT, Tuple[int, float, GO_COLOR]], color: GO_COLOR) -> CustomTreeNode:
+        """
+        A one-level tree holding the summed root child statistics and proven values.
+        """
+        root = CustomTreeNode(color)
+        for move, (visits, wins, proven) in merged.items():
+            child = CustomTreeNode(get_opponent(color))
+            child.move = move
+            child.n_visits = visits
+            child.n_opponent_wins = wins
+            child.proven = proven
+            root.children[move] = child
+            root.n_visits += visits
+        root.exp = True
+        return root
+
+    def update_with_move(self, last_move: GO_POINT) -> None:
+        for conn in self.connections:
+            conn.send(("update", last_move))
+        self.root = CustomTreeNode(get_opponent(self.toplay))
+        self.toplay = get_opponent(self.toplay)
+
+    def reset(self) -> None:
+        for conn in self.connections:
+            conn.send(("reset",))
+        self.root = CustomTreeNode(BLACK)
+        self.toplay = BLACK
+
+    def close(self) -> None:
+        for conn in self.connections:
+            conn.send(("close",))
+        for process in self.processes:
+            process.join(timeout=1)
+        self.connections = []
+        self.processes = []
+
+    def get_toplay(self) -> GO_COLOR:
+        return self.toplay
+
+    def get_root(self) -> CustomTreeNode:
+        return self.root
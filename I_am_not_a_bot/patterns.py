@@ -0,0 +1,207 @@
+"""
+patterns.py
+Precomputed line-pattern tables for the GoBoard heuristics.
+
+A window of cells along a line is encoded as a base-4 integer, cell k
+(counted from the point outwards) contributing color * 4 ** k with
+EMPTY=0, BLACK=1, WHITE=2 and BORDER=3. The tables map every code of a
+given window length to what the scanning loops of GoBoard.hr,
+detect_three_and_four and has_open_four_in_list would find in it, so those
+functions become a few table lookups per line.
+
+The eight half lines through a point are taken in the order of
+GoBoard._neighbors followed by GoBoard._diag_neighbors, so half lines
+2 * d and 2 * d + 1 form line d.
+"""
+import numpy as np
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from board_base import board_array_size, BLACK, WHITE, EMPTY, BORDER
+
+"""
+Number of cells looked at along each half line. GoBoard.hr never looks
+further than 6 points away from the point it evaluates.
+"""
+PATTERN_LENGTH: int = 6
+
+
+def encode(cells: List[int]) -> int:
+    """ Base-4 code of a window, cells[0] being the least significant digit """
+    code = 0
+    for cell in reversed(cells):
+        code = code * 4 + cell
+    return code
+
+
+def decode(code: int, length: int) -> List[int]:
+    cells = []
+    for _ in range(length):
+        cells.append(code % 4)
+        code //= 4
+    return cells
+
+
+def line_score(count: int, dc: float, closed: int) -> float:
+    """
+    Value of count stones in a line with closed blocked ends, dc = 0.9 if
+    the line has a gap. This is GoBoard.cc_hrl.
+    """
+    if count >= 5:
+        return 10 ** 5
+    elif closed == 0:
+        return (10 ** count) * dc
+    elif closed == 1 and count != 2:
+        return (10 ** (count - 1)) * dc
+    else:
+        return 0
+
+
+def _hr_half(cells: List[int], color: int, count: int) -> Tuple[int, int, float]:
+    """
+    The walk of GoBoard.hr along one half line, starting with count stones.
+    Returns (count, closed ends, dc).
+    The scanning loop also set dc = 0.9 when the point after a gap had the
+    index of the opponent color, which only two border points ever do;
+    that comparison is not reproduced.
+    """
+    cells = cells + [BORDER]
+    closed = 0
+    dc = 1
+    k = 0
+    while cells[k] == color:
+        count += 1
+        if count == 5:
+            break
+        k += 1
+    if cells[k] != EMPTY:
+        closed += 1
+    elif count < 4:
+        k += 1
+        if cells[k] == color:
+            dc = 0.9
+            while cells[k] == color:
+                count += 1
+                k += 1
+                if count >= 5:
+                    count -= 1
+                    break
+            if cells[k] != EMPTY:
+                closed += 1
+    return count, closed, dc
+
+
+def _run(cells: List[int], color: int) -> Tuple[int, bool]:
+    """
+    Stones of color next to the point and whether the cell after them is empty.
+    A window full of stones counts as closed.
+    """
+    stones = 0
+    while stones < len(cells) and cells[stones] == color:
+        stones += 1
+    return stones, stones < len(cells) and cells[stones] == EMPTY
+
+
+def _open_four(cells: List[int]) -> Optional[Tuple[int, int]]:
+    """
+    The patterns of GoBoard.has_open_four_in_list in a 6 cell window, in the
+    same order. Returns (color, offset of the completing point) or None.
+    """
+    w = cells
+    # Pattern .X.XX.
+    if w[0] == EMPTY and w[1] != EMPTY and w[1] == w[3] == w[4] and w[2] == EMPTY and w[5] == EMPTY:
+        return w[1], 2
+    # Pattern .XXX..
+    elif w[0] == EMPTY and w[1] != EMPTY and w[1] == w[2] == w[3] and w[4] == EMPTY and w[5] == EMPTY:
+        return w[1], 4
+    # Pattern ..XXX.
+    elif w[0] == EMPTY and w[2] != EMPTY and w[2] == w[3] == w[4] and w[1] == EMPTY and w[5] == EMPTY:
+        return w[2], 1
+    # Pattern .XX.X.
+    elif w[0] == EMPTY and w[1] != EMPTY and w[1] == w[2] == w[4] and w[3] == EMPTY and w[5] == EMPTY:
+        return w[1], 3
+    return None
+
+
+class LineTables(object):
+    def __init__(self, length: int) -> None:
+        """
+        Tables for half line windows of length cells, indexed by color and code.
+
+        hr_first[color][code]: (count, variant) after the first half of a line,
+            variant = 2 * closed + (1 if the half had a gap else 0)
+        hr_second[color][count][code][variant]: hr value of the whole line
+            given the first half ended with count < 5 stones and variant
+        runs[color][code]: (stones next to the point, open) for detect_three_and_four
+        """
+        self.length: int = length
+        self.powers: np.ndarray = 4 ** np.arange(length, dtype=np.int64)
+        n_codes = 4 ** length
+        windows = [decode(code, length) for code in range(n_codes)]
+        self.hr_first: List[List[Tuple[int, int]]] = [[], [], []]
+        self.hr_second: List[List[List[Tuple[float, ...]]]] = [[], [], []]
+        self.runs: List[List[Tuple[int, bool]]] = [[], [], []]
+        variants = [(closed, dc) for closed in (0, 1) for dc in (1, 0.9)]
+        for color in (BLACK, WHITE):
+            for cells in windows:
+                count, closed, dc = _hr_half(cells, color, 1)
+                self.hr_first[color].append((count, 2 * closed + (dc != 1)))
+            self.hr_second[color] = [[]]
+            for count_in in range(1, 5):
+                table = []
+                for cells in windows:
+                    count, closed, dc = _hr_half(cells, color, count_in)
+                    scores = []
+                    for first_closed, first_dc in variants:
+                        if count > 1:
+                            scores.append(line_score(count, min(dc, first_dc), closed + first_closed))
+                        else:
+                            scores.append(0)
+                    table.append(tuple(scores))
+                self.hr_second[color].append(table)
+            self.runs[color] = [_run(cells, color) for cells in windows]
+
+
+@lru_cache(maxsize=None)
+def get_line_tables(length: int = PATTERN_LENGTH) -> LineTables:
+    """
+    Return the tables for a window length. They are built once and shared by all boards.
+    """
+    return LineTables(length)
+
+
+@lru_cache(maxsize=None)
+def open_four_table() -> List[Optional[Tuple[int, int]]]:
+    """
+    _open_four of every 6 cell window, indexed by its code.
+    """
+    return [_open_four(decode(code, 6)) for code in range(4 ** 6)]
+
+
+@lru_cache(maxsize=None)
+def line_windows(size: int, length: int = PATTERN_LENGTH) -> np.ndarray:
+    """
+    For every point, the points of its eight half line windows of length
+    cells, shape (maxpoint, 8, length). Cells from the first border point
+    on all repeat that border point, so every index stays on the board array.
+    """
+    NS = size + 1
+    maxpoint = board_array_size(size)
+    offsets = [-1, 1, -NS, NS, -NS - 1, NS + 1, -NS + 1, NS - 1]
+    is_border = np.ones(maxpoint, dtype=bool)
+    for row in range(1, size + 1):
+        start = row * NS + 1
+        is_border[start:start + size] = False
+    windows = np.zeros((maxpoint, 8, length), dtype=np.int64)
+    for point in range(maxpoint):
+        for h, offset in enumerate(offsets):
+            p = point
+            for k in range(length):
+                if 0 <= p < maxpoint and is_border[p] and p != point:
+                    windows[point, h, k] = p
+                    continue
+                p += offset
+                if not 0 <= p < maxpoint:
+                    p = 0
+                windows[point, h, k] = p
+    return windows
@@ -0,0 +1,259 @@
+"""
+pool_mcts.py
+CustomMCTS on a NodePool instead of CustomTreeNode objects.
+
+The search is the same as CustomMCTS (UCT with the cc_heur prior, random
+rollouts on a BitBoard, copy-free descent with undo), but nodes are ids
+into the arrays of a NodePool and selection is one vectorised argmax per
+tree level.
+
+As with CustomMCTS, the tree is kept from move to move: update_with_move
+and reuse_tree move the root and compact the pool to the root's subtree,
+so the other nodes are freed. When the tree outgrows its memory budget,
+the subtrees of the nodes with the fewest visits are collapsed.
+"""
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from board_base import opponent as get_opponent, BLACK, GO_COLOR, GO_POINT
+from board import GoBoard
+from bitboard import BitBoard
+from mcts import CustomMCTS, DEFAULT_TREE_BYTES, PRUNE_FRACTION
+from node_pool import NodePool, UNEXPANDED, TERMINAL, NODE_BYTES
+from time_manager import top_two, decided, STOP_CHECK_INTERVAL
+from tree import CustomTreeNode
+
+DEFAULT_POOL_SIZE: int = 65536
+
+
+class PoolMCTS:
+    def __init__(self, capacity: int = DEFAULT_POOL_SIZE) -> None:
+        self.pool: NodePool = NodePool(capacity)
+        self.toplay: GO_COLOR = BLACK
+        self.root: int = self.pool.reset(BLACK)
+        self.max_nodes: int = DEFAULT_TREE_BYTES // NODE_BYTES
+        # The board's move history at the root position (see reuse_tree)
+        self.root_moves: List[GO_POINT] = []
+        self.exploration: float = 0.6
+        self.heuristic_weight: float = 1
+        # Stop get_move before the time limit once the best move is decided.
+        self.early_stop: bool = True
+
+    def get_move(self, board: GoBoard, color: GO_COLOR, time_limit: float, exp: float, hw: float) -> GO_POINT:
+        self.solve_start_time = time.time()
+        self.reuse_tree(board, color)
+        self.exploration = exp
+        self.heuristic_weight = hw
+        deadline = self.solve_start_time + time_limit - 0.03
+        keep_going = self.search_clock(deadline)
+        if self.pool.state[self.root] == UNEXPANDED and not board.EndGame()[0]:
+            self.pool.expand(self.root, board.get_empty_points())
+        if board.current_player == color:
+            n_moves = len(board.move_history)
+            try:
+                while keep_going():
+                    self.search(board, color)
+                    board.undo_to(n_moves)
+                    if self.pool.size() > self.max_nodes:
+                        self.prune()
+            finally:
+                board.undo_to(n_moves)
+        else:
+            while keep_going():
+                self.search(board.copy(), color)
+                if self.pool.size() > self.max_nodes:
+                    self.prune()
+        if self.pool.visits[self.root] == 0 or self.pool.child_count[self.root] == 0:
+            # No search finished in time
+            return GO_POINT(board.random_empty_point())
+        best = self.pool.best_child(self.root)
+        return GO_POINT(self.pool.move[best])
+
+    def search_clock(self, deadline: float) -> Callable[[], bool]:
+        """
+        As CustomMCTS.search_clock, on the pool.
+        """
+        pool = self.pool
+        start = time.time()
+        start_visits = int(pool.visits[self.root])
+        calls = 0
+
+        def keep_going() -> bool:
+            nonlocal calls
+            now = time.time()
+            if now >= deadline:
+                return False
+            calls += 1
+            if self.early_stop and calls % STOP_CHECK_INTERVAL == 0:
+                children = pool.children(self.root)
+                if len(children) == 1:
+                    return False
+                best, second = top_two(pool.visits[children.start:children.stop].tolist())
+                return not decided(best, second, int(pool.visits[self.root]) - start_visits,
+                                   now - start, deadline - now)
+            return True
+        return keep_going
+
+    def search(self, board: GoBoard, color: GO_COLOR) -> None:
+        """
+        One descent from the root, expansion of the leaf, rollout and backup.
+        """
+        pool = self.pool
+        node = self.root
+        path: List[int] = [node]
+        while True:
+            terminal, winner = board.EndGame()
+            if terminal:
+                pool.state[node] = TERMINAL
+                break
+            if pool.state[node] == UNEXPANDED:
+                pool.expand(node, board.get_empty_points())
+                winner = CustomMCTS.rollout(BitBoard.for_rollout(board), color)
+                break
+            node = pool.select(node, board, self.exploration, self.heuristic_weight)
+            path.append(node)
+            board.play_move(pool.move[node], color)
+            color = get_opponent(color)
+        pool.backup(path, winner)
+
+    def prune(self) -> None:
+        """
+        As CustomMCTS.prune: collapse the subtrees of the nodes with the fewest
+        visits until the tree has at most PRUNE_FRACTION * max_nodes nodes.
+        """
+        pool = self.pool
+        n = pool.size()
+        target = int(self.max_nodes * PRUNE_FRACTION)
+        # Every allocated node is in the root's subtree, since the pool is
+        # compacted whenever the root moves.
+        expanded = np.flatnonzero(pool.child_count[:n] > 0)
+        expanded = expanded[expanded != self.root]
+        if expanded.size == 0:
+            return
+        visits = pool.visits[expanded]
+        order = np.argsort(visits, kind="stable")
+        freed = np.cumsum(pool.child_count[expanded][order])
+        k = min(int(np.searchsorted(freed, n - target)), len(order) - 1)
+        collapsed = expanded[visits <= visits[order[k]]]
+        pool.child_count[collapsed] = 0
+        pool.state[collapsed] = UNEXPANDED
+        self.root = pool.compact(self.root)
+
+    def update_with_move(self, last_move: GO_POINT) -> None:
+        """
+        Make the child of last_move the root if the tree is for the player who
+        made it, and free the rest of the tree. Otherwise the tree is kept
+        as it is, and the next search finds its position with reuse_tree.
+        """
+        mover = self.toplay
+        self.toplay = get_opponent(mover)
+        child = self.pool.find_child(self.root, last_move)
+        if child < 0 or self.pool.color[self.root] != mover:
+            return
+        self.root = self.pool.compact(child)
+        self.root_moves.append(last_move)
+
+    def reuse_tree(self, board: GoBoard, color: GO_COLOR) -> None:
+        """
+        Make the root the node of board with color to play, found by following
+        the moves played on board since the root position, and free the rest
+        of the tree. A new tree is started if it is not in the tree.
+        """
+        pool = self.pool
+        history = board.move_history
+        node = self.root
+        n = len(self.root_moves)
+        if history[:n] != self.root_moves:
+            node = -1
+        for move in history[n:]:
+            if node < 0:
+                break
+            node = pool.find_child(node, move)
+        if node >= 0 and pool.color[node] != color:
+            node = -1
+        self.toplay = color
+        if node < 0:
+            self.reset_tree()
+        elif node != self.root:
+            self.root = pool.compact(node)
+        self.root_moves = list(history)
+
+    def reset(self) -> None:
+        self.toplay = BLACK
+        self.reset_tree()
+
+    def reset_tree(self) -> None:
+        self.root = self.pool.reset(self.toplay)
+        self.root_moves = []
+
+    def set_tree_budget(self, max_bytes: int) -> None:
+        """
+        Keep the nodes of the tree under max_bytes.
+        """
+        self.max_nodes = max(max_bytes // NODE_BYTES, 1)
+
+    def tree_size(self) -> Tuple[int, int]:
+        """
+        (nodes, bytes) of the tree.
+        """
+        return self.pool.size(), self.pool.nbytes()
+
+    def get_toplay(self) -> GO_COLOR:
+        return self.toplay
+
+    def get_root(self) -> int:
+        return self.root
+
+
+def node_benchmark(size: int = 19, repeats: int = 200) -> None:
+    """
+    Compare CustomTreeNode and NodePool: memory per node and the time of one
+    selection step at a root whose children have all been visited.
+    """
+    board = GoBoard(size)
+    rng = np.random.default_rng(0)
+    moves = board.get_empty_points()
+    visits = rng.integers(1, 50, moves.size)
+    wins = rng.random(moves.size) * visits
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root = CustomTreeNode(BLACK)
+    root.expdf(board, BLACK)
+    object_bytes = (tracemalloc.get_traced_memory()[0] - before) / (moves.size + 1)
+    tracemalloc.stop()
+    for (move, child), v, w in zip(root.children.items(), visits, wins):
+        child.n_visits = int(v)
+        child.n_opponent_wins = float(w)
+        root.priors[move] = board.cc_heur(move, child.color)
+    root.n_visits = int(visits.sum())
+
+    pool = NodePool(moves.size + 1)
+    pool.reset(BLACK)
+    pool.expand(0, moves)
+    pool.visits[1:] = visits
+    pool.wins[1:] = wins
+    pool.visits[0] = visits.sum()
+    pool.select(0, board, 0.6, 1)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        root.select_in_tree(0.6, 1, board)
+    object_time = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        pool.select(0, board, 0.6, 1)
+    pool_time = (time.perf_counter() - start) / repeats
+    print("{}x{} root, {} children".format(size, size, moves.size))
+    print("bytes per node:   CustomTreeNode {:8.0f}   NodePool {:8d}   ratio {:5.1f}".format(
+        object_bytes, NODE_BYTES, object_bytes / NODE_BYTES))
+    print("select time (us): CustomTreeNode {:8.1f}   NodePool {:8.1f}   ratio {:5.1f}".format(
+        object_time * 1e6, pool_time * 1e6, object_time / pool_time))
+
+
+if __name__ == "__main__":
+    for size in (7, 13, 19):
+        node_benchmark(size)
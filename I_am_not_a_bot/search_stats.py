@@ -0,0 +1,81 @@
+"""
+search_stats.py
+Counters and timers for the phases of CustomMCTS simulations.
+
+With stats switched on, CustomMCTS.expand, descend and search record here
+the time spent in each phase of a simulation (expand, select, play,
+rollout, backup), the depth of every leaf, the branching factor of
+expanded nodes, transposition hits and rollout lengths. With stats
+switched off they skip the clock and record nothing, so the
+instrumentation costs one test per phase.
+"""
+from typing import Dict, List
+
+PHASES: List[str] = ["expand", "select", "play", "rollout", "backup"]
+
+
+class SearchStats(object):
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.time: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.calls: Dict[str, int] = dict.fromkeys(PHASES, 0)
+        self.simulations: int = 0
+        self.search_time: float = 0.0
+        # depth_counts[d]: simulations whose leaf was d moves below the root
+        self.depth_counts: List[int] = []
+        self.expansions: int = 0
+        self.children: int = 0
+        self.max_children: int = 0
+        self.transpositions: int = 0
+        self.rollout_moves: int = 0
+        # simulations that ended in a proven node instead of a rollout
+        self.proven: int = 0
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.time[phase] += seconds
+        self.calls[phase] += 1
+
+    def add_expansion(self, n_children: int, seconds: float) -> None:
+        self.add_time("expand", seconds)
+        self.expansions += 1
+        self.children += n_children
+        self.max_children = max(self.max_children, n_children)
+
+    def add_depth(self, depth: int) -> None:
+        self.simulations += 1
+        while len(self.depth_counts) <= depth:
+            self.depth_counts.append(0)
+        self.depth_counts[depth] += 1
+
+    def mean_depth(self) -> float:
+        if self.simulations == 0:
+            return 0.0
+        return sum(d * n for d, n in enumerate(self.depth_counts)) / self.simulations
+
+    def report(self) -> str:
+        """
+        Readable summary of everything recorded since the last reset.
+        """
+        lines = []
+        rate = self.simulations / self.search_time if self.search_time > 0 else 0.0
+        lines.append("simulations {} in {:.3f} s ({:.0f}/s)".format(self.simulations, self.search_time, rate))
+        total = sum(self.time.values())
+        lines.append("{:8s} {:>9s} {:>9s} {:>9s} {:>6s}".format("phase", "calls", "total s", "us/call", "share"))
+        for phase in PHASES:
+            calls = self.calls[phase]
+            seconds = self.time[phase]
+            lines.append("{:8s} {:9d} {:9.3f} {:9.1f} {:5.1f}%".format(
+                phase, calls, seconds, seconds / calls * 1e6 if calls else 0.0,
+                100 * seconds / total if total > 0 else 0.0))
+        histogram = " ".join("{}:{}".format(d, n) for d, n in enumerate(self.depth_counts) if n > 0)
+        lines.append("depth histogram " + histogram)
+        lines.append("mean depth {:.2f}, max depth {}".format(self.mean_depth(), len(self.depth_counts) - 1))
+        branching = self.children / self.expansions if self.expansions else 0.0
+        lines.append("expansions {}, mean branching {:.1f}, max branching {}".format(
+            self.expansions, branching, self.max_children))
+        lines.append("transpositions {}, proven leaves {}".format(self.transpositions, self.proven))
+        rollouts = self.calls["rollout"]
+        lines.append("mean rollout length {:.1f}".format(self.rollout_moves / rollouts if rollouts else 0.0))
+        return "\n".join(lines)
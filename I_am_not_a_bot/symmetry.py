@@ -0,0 +1,99 @@
+"""
+symmetry.py
+The 8 symmetries of the square board on the padded 1-D layout.
+
+Each symmetry is a permutation of the points of a board size; border
+points map to themselves. The canonical form of a position is its image
+with the smallest Zobrist hash, computed for all 8 images at once from
+per-symmetry copies of the stone keys. Ninuki's rules are symmetric, so
+symmetric positions have the same value and symmetric moves are equivalent.
+"""
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+from board_base import BLACK, WHITE, board_array_size, coord_to_point
+from board import GoBoard
+from zobrist import get_zobrist_keys
+
+
+def transform(row: int, col: int, size: int, s: int) -> Tuple[int, int]:
+    """
+    Image of (row, col) under symmetry s, 0 being the identity.
+    """
+    if s & 1:
+        row = size + 1 - row
+    if s & 2:
+        col = size + 1 - col
+    if s & 4:
+        row, col = col, row
+    return row, col
+
+
+class Symmetry(object):
+    def __init__(self, size: int) -> None:
+        """
+        permutations[s][point]: image of point under symmetry s
+        inverses[s][point]: point whose image under symmetry s is point
+        stone_keys[color][s][point]: Zobrist key of a stone of color on the image of point
+        """
+        maxpoint = board_array_size(size)
+        self.size: int = size
+        self.permutations: np.ndarray = np.tile(np.arange(maxpoint), (8, 1))
+        for s in range(8):
+            for row in range(1, size + 1):
+                for col in range(1, size + 1):
+                    image = transform(row, col, size, s)
+                    self.permutations[s, coord_to_point(row, col, size)] = coord_to_point(image[0], image[1], size)
+        self.inverses: np.ndarray = np.argsort(self.permutations, axis=1)
+        z = get_zobrist_keys(size)
+        self.stone_keys: List[np.ndarray] = [None, None, None]
+        for color in (BLACK, WHITE):
+            keys = np.array(z.stones[color], dtype=np.uint64)
+            self.stone_keys[color] = keys[self.permutations]
+
+    def hashes(self, board: GoBoard) -> np.ndarray:
+        """
+        The Zobrist hashes of the 8 images of board; hashes[0] is board.hash.
+        """
+        images = np.zeros(8, dtype=np.uint64)
+        for color in (BLACK, WHITE):
+            stones = np.flatnonzero(board.board == color)
+            images ^= np.bitwise_xor.reduce(self.stone_keys[color][:, stones], axis=1)
+        # The side to move and capture keys are the same for every image
+        return images ^ (images[0] ^ np.uint64(board.hash))
+
+    def canonical(self, board: GoBoard) -> Tuple[int, int]:
+        """
+        (canonical hash, s): the smallest hash of an image of board, and the
+        symmetry s that maps board to that image.
+        """
+        hashes = self.hashes(board)
+        s = int(np.argmin(hashes))
+        return int(hashes[s]), s
+
+    def invariant(self, board: GoBoard) -> np.ndarray:
+        """
+        The symmetries that map board to itself. Always includes the identity 0.
+        """
+        return np.flatnonzero((board.board[self.inverses] == board.board).all(axis=1))
+
+    def smallest_images(self, board: GoBoard, moves: np.ndarray) -> np.ndarray:
+        """
+        For each move, the smallest point among the moves symmetric to it on
+        board. Moves with a smaller symmetric move are redundant.
+        """
+        invariant = self.invariant(board)
+        if len(invariant) == 1:
+            return moves
+        return self.permutations[invariant][:, moves].min(axis=0)
+
+
+@lru_cache(maxsize=None)
+def get_symmetry(size: int) -> Symmetry:
+    """
+    Return the tables for a board size. They are created once and shared by all boards.
+    """
+    return Symmetry(size)
+
@@ -0,0 +1,63 @@
+"""
+BitBoard must agree with GoBoard after every move, probe and rollback.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from board_base import BLACK, WHITE
+from board import GoBoard
+from bitboard import BitBoard
+
+
+def assert_same(g: GoBoard, b: BitBoard) -> None:
+    assert np.array_equal(g.board, b.board)
+    assert g.hash == b.hash == b.compute_hash()
+    assert g.current_player == b.current_player
+    assert g.last_move == b.last_move and g.last2_move == b.last2_move
+    assert g.get_captures(BLACK) == b.get_captures(BLACK)
+    assert g.get_captures(WHITE) == b.get_captures(WHITE)
+    assert np.array_equal(np.sort(g.get_empty_points()), b.get_empty_points())
+    assert g.EndGame() == b.EndGame()
+
+
+@pytest.mark.parametrize("size", [5, 7, 9, 13, 19])
+def test_bitboard_agrees_with_goboard(size):
+    """
+    Random games played on both backends side by side, with play_rm/undo
+    probes and undo_move/undo_to rollbacks.
+    """
+    rng = random.Random(size)
+    for _ in range(10):
+        g = GoBoard(size)
+        b = BitBoard(size)
+        while not g.EndGame()[0]:
+            move = rng.choice(list(g.get_empty_points()))
+            probe_color = rng.choice((BLACK, WHITE))
+            assert g.play_rm(move, probe_color) == b.play_rm(move, probe_color)
+            assert g.five_detect(move) == b.five_detect(move)
+            g.undo(move)
+            b.undo(move)
+            assert g.play_move(move, g.current_player) == b.play_move(move, b.current_player)
+            assert_same(g, b)
+            if rng.random() < 0.05:
+                n_moves = rng.randrange(len(g.move_history) + 1)
+                g.undo_to(n_moves)
+                b.undo_to(n_moves)
+                assert_same(g, b)
+        assert g.EndGame() == b.EndGame()
+
+
+@pytest.mark.parametrize("size", [7, 19])
+def test_for_rollout_holds_the_position(size):
+    rng = random.Random(size)
+    g = GoBoard(size)
+    for _ in range(size * 2):
+        g.play_move(rng.choice(list(g.get_empty_points())), g.current_player)
+    b = BitBoard.for_rollout(g)
+    assert np.array_equal(g.board, b.board)
+    assert g.hash == b.hash == b.compute_hash()
+    assert g.current_player == b.current_player
+    assert (g.get_captures(BLACK), g.get_captures(WHITE)) == (b.get_captures(BLACK), b.get_captures(WHITE))
+    assert b.move_history == []
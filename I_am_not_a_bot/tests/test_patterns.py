@@ -0,0 +1,119 @@
+"""
+The pattern table versions of hr, detect_three_and_four and
+has_open_four_in_list must agree with the board walks they replaced.
+
+The reference walks below are the old GoBoard code, without its
+comparison of a point index to a color in hr (see patterns.py).
+"""
+import random
+
+import pytest
+
+from board_base import BLACK, WHITE, EMPTY
+from board import GoBoard
+
+
+def reference_hr(board: GoBoard, point, color):
+    heuristic = 0
+
+    def calculate_heuristic(neighbors, diag=False):
+        nonlocal heuristic
+        step = board._diag_neighbors if diag else board._neighbors
+        count = 1
+        closed = 0
+        dc = 1
+        for i, nb in enumerate(neighbors):
+            if i % 2 == 0:
+                if count > 1:
+                    heuristic += board.cc_hrl(count, dc, closed)
+                count = 1
+                closed = 0
+                dc = 1
+            neighbor = nb
+            while board.board[neighbor] == color:
+                count += 1
+                if count == 5:
+                    break
+                neighbor = step(neighbor)[i]
+            if board.board[neighbor] != EMPTY:
+                closed += 1
+            elif board.board[neighbor] == EMPTY and count < 4:
+                neighbor = step(neighbor)[i]
+                if board.board[neighbor] == color:
+                    dc = 0.9
+                    while board.board[neighbor] == color:
+                        count += 1
+                        neighbor = step(neighbor)[i]
+                        if count >= 5:
+                            count -= 1
+                            break
+                    if board.board[neighbor] != EMPTY:
+                        closed += 1
+        if count > 1:
+            heuristic += board.cc_hrl(count, dc, closed)
+
+    calculate_heuristic(board._neighbors(point))
+    calculate_heuristic(board._diag_neighbors(point), diag=True)
+    return heuristic
+
+
+def reference_three_and_four(board: GoBoard, point, color):
+    max_count = 1
+    for neighbors, step in ((board._neighbors(point), board._neighbors),
+                            (board._diag_neighbors(point), board._diag_neighbors)):
+        i = 0
+        while i < len(neighbors):
+            if i % 2 == 0:
+                count = 1
+                closed = False
+            if closed:
+                i += 1
+                continue
+            neighbor = neighbors[i]
+            while board.board[neighbor] == color:
+                count += 1
+                neighbor = step(neighbor)[i]
+            if board.board[neighbor] != EMPTY:
+                closed = True
+            elif count > max_count:
+                max_count = count
+                if max_count == 4:
+                    return 4
+            i += 1
+    return max_count
+
+
+def reference_open_four(board: GoBoard, points):
+    op4_pos = []
+    c = board.get_color
+    for i in range(len(points) - 6 + 1):
+        w = points[i:i + 6]
+        if (c(w[0]) == EMPTY and c(w[1]) != EMPTY and c(w[1]) == c(w[3]) == c(w[4])
+                and c(w[2]) == EMPTY and c(w[5]) == EMPTY):
+            op4_pos.append((c(w[1]), points[i + 2]))
+        elif (c(w[0]) == EMPTY and c(w[1]) != EMPTY and c(w[1]) == c(w[2]) == c(w[3])
+                and c(w[4]) == EMPTY and c(w[5]) == EMPTY):
+            op4_pos.append((c(w[1]), points[i + 4]))
+        elif (c(w[0]) == EMPTY and c(w[2]) != EMPTY and c(w[2]) == c(w[3]) == c(w[4])
+                and c(w[1]) == EMPTY and c(w[5]) == EMPTY):
+            op4_pos.append((c(w[2]), points[i + 1]))
+        elif (c(w[0]) == EMPTY and c(w[1]) != EMPTY and c(w[1]) == c(w[2]) == c(w[4])
+                and c(w[3]) == EMPTY and c(w[5]) == EMPTY):
+            op4_pos.append((c(w[1]), points[i + 3]))
+    return op4_pos
+
+
+@pytest.mark.parametrize("size", [5, 7, 9, 13, 19])
+def test_pattern_tables_agree_with_board_walks(size):
+    rng = random.Random(size)
+    for _ in range(3):
+        board = GoBoard(size)
+        while not board.EndGame()[0]:
+            for point in board.get_empty_points():
+                for color in (BLACK, WHITE):
+                    assert board.hr(point, color) == reference_hr(board, point, color)
+                    assert board.detect_three_and_four(point, color) == reference_three_and_four(board, point, color)
+            for line in board.rows + board.cols + board.diags:
+                found = [(int(c), int(p)) for c, p in board.has_open_four_in_list(line)]
+                assert found == [(int(c), int(p)) for c, p in reference_open_four(board, line)]
+            board.play_move(rng.choice(list(board.get_empty_points())), board.current_player)
@@ -0,0 +1,147 @@
+"""
+threat_space.py
+Threat-space search: forced wins made of forcing moves only.
+
+The attacker only plays forcing moves, after which it wins on its next
+move unless the defender answers: fours found by detect_three_and_four,
+open fours made from threes found by detect_open_four, and with eight
+captures, moves that threaten the tenth. A move is kept only if it
+really leaves the attacker a winning point. The defender gets every
+reply that can stop the threat, which is a move on a winning point or a
+capture (is_captured); any other move loses at once. A defender with a
+winning point of its own refutes the threat.
+
+The search deepens one forcing move at a time up to MAX_THREAT_DEPTH, so
+the first win found is a shortest one. Positions of the attacker are
+remembered with the depth they failed at, or the winning move.
+"""
+import time
+from typing import Dict, List, Optional
+
+from board_base import EMPTY, GO_COLOR, GO_POINT, opponent
+from board import GoBoard
+
+"""
+Most forcing moves of the attacker in a searched sequence.
+"""
+MAX_THREAT_DEPTH: int = 8
+
+"""
+Share of the move's time the player gives the threat-space search before MCTS.
+"""
+THREAT_TIME_FRACTION: float = 0.1
+
+"""
+Nodes searched between two checks of the clock.
+"""
+TIME_CHECK_INTERVAL: int = 50
+
+
+class ThreatSpaceSearch(object):
+    def __init__(self, max_depth: int = MAX_THREAT_DEPTH) -> None:
+        self.max_depth: int = max_depth
+        self.attacker: GO_COLOR = EMPTY
+        self.deadline: float = 0.0
+        self.timed_out: bool = False
+        self.nodes: int = 0
+        # failed[hash]: deepest search of the attacker's position that found no win
+        self.failed: Dict[int, int] = {}
+        self.wins: Dict[int, GO_POINT] = {}
+
+    def find_win(self, board: GoBoard, color: GO_COLOR, time_limit: float) -> Optional[GO_POINT]:
+        """
+        The first move of a forced win of color on board, or None if there is
+        none within max_depth forcing moves or time_limit seconds.
+        """
+        if board.EndGame()[0]:
+            return None
+        board = board.copy()
+        self.attacker = color
+        self.deadline = time.time() + time_limit
+        self.timed_out = False
+        self.nodes = 0
+        self.failed.clear()
+        self.wins.clear()
+        for depth in range(1, self.max_depth + 1):
+            move = self.attack(board, depth)
+            if move is not None or self.timed_out:
+                return move
+        return None
+
+    def attack(self, board: GoBoard, depth: int) -> Optional[GO_POINT]:
+        """
+        A move of the attacker that wins at once or with at most depth
+        forcing moves, or None.
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and time.time() > self.deadline:
+            self.timed_out = True
+        if self.timed_out:
+            return None
+        key = board.hash
+        if key in self.wins:
+            return self.wins[key]
+        color = self.attacker
+        for point in board.get_empty_points():
+            if board.wins_at(point, color):
+                return int(point)
+        if depth == 0 or self.failed.get(key, 0) >= depth:
+            return None
+        for move in self.forcing_moves(board):
+            board.play_move(move, color)
+            threats = self.win_points(board, color)
+            won = len(threats) > 0 and self.defend(board, threats, depth - 1)
+            board.undo_move()
+            if won:
+                self.wins[key] = move
+                return move
+            if self.timed_out:
+                return None
+        self.failed[key] = depth
+        return None
+
+    def defend(self, board: GoBoard, threats: List[GO_POINT], depth: int) -> bool:
+        """
+        Whether the attacker still wins within depth forcing moves after every
+        reply of the defender to the winning points threats.
+        """
+        color = opponent(self.attacker)
+        replies = dict.fromkeys(threats)
+        for point in board.get_empty_points():
+            if board.wins_at(point, color):
+                return False
+            if board.is_captured(point, color):
+                replies[int(point)] = None
+        for reply in replies:
+            board.play_move(reply, color)
+            won = self.attack(board, depth) is not None
+            board.undo_move()
+            if not won:
+                return False
+        return True
+
+    def forcing_moves(self, board: GoBoard) -> List[GO_POINT]:
+        """
+        Candidate forcing moves of the attacker: fours, then open fours made
+        from threes, then threats of a tenth capture.
+        """
+        color = self.attacker
+        empty_points = board.get_empty_points()
+        moves = [point for point in empty_points if board.detect_three_and_four(point, color) == 4]
+        for line in board.detect_open_four():
+            moves += [point for c, point in line if c == color]
+        if board.get_captures(color) >= 8:
+            O = opponent(color)
+            cells = board.board
+            for point in empty_points:
+                for p1, p2, p3 in board.geometry.capture_rays[point]:
+                    if cells[p1] == O and cells[p2] == O and cells[p3] == EMPTY:
+                        moves.append(point)
+                        break
+        return [int(point) for point in dict.fromkeys(moves)]
+
+    def win_points(self, board: GoBoard, color: GO_COLOR) -> List[GO_POINT]:
+        """
+        The empty points where color wins by playing.
+        """
+        return [int(point) for point in board.get_empty_points() if board.wins_at(point, color)]
@@ -0,0 +1,135 @@
+"""
+time_manager.py
+Time control for the player: how long to search for each move.
+
+Without a clock (the timelimit command) every move gets the same budget.
+With GTP time_settings / time_left the remaining main time is spread over
+the moves the player is still expected to make, estimated from the number
+of empty points; in byo-yomi the period time is split over its stones.
+The clock is also run down locally after each move, for controllers that
+do not send time_left.
+
+Independently of the budget, a search can stop as soon as its best root
+move is decided: when the runner-up could not catch up with the best move's
+visit count even if every remaining playout went to it.
+"""
+import heapq
+from typing import Iterable, List, Tuple
+
+from board_base import BLACK, WHITE, GO_COLOR
+from board import GoBoard
+
+"""
+Seconds kept back from the clock for move transmission and process overhead.
+"""
+SAFETY_MARGIN: float = 0.2
+MIN_MOVE_TIME: float = 0.05
+
+"""
+Games rarely fill more than half of the empty points before five in a
+row or ten captures end them, and the player makes half of those moves.
+"""
+EXPECTED_FILL: float = 0.5
+MIN_MOVES_LEFT: int = 4
+
+"""
+Simulations between two checks of whether the best move is decided.
+"""
+STOP_CHECK_INTERVAL: int = 16
+
+
+class TimeManager(object):
+    def __init__(self, move_time: float = 1.0) -> None:
+        self.move_time: float = move_time
+        self.clock: bool = False
+        self.main_time: float = 0.0
+        self.byo_yomi_time: float = 0.0
+        self.byo_yomi_stones: int = 0
+        # Per color: seconds left in the current period, and stones left
+        # in it (0 while still in main time)
+        self.time_left: List[float] = [0.0, 0.0, 0.0]
+        self.stones_left: List[int] = [0, 0, 0]
+
+    def set_move_time(self, seconds: float) -> None:
+        """
+        Use a fixed budget of seconds for every move and ignore any clock.
+        """
+        self.move_time = seconds
+        self.clock = False
+
+    def set_time_settings(self, main_time: float, byo_yomi_time: float, byo_yomi_stones: int) -> None:
+        """
+        GTP time_settings. As in the GTP spec, byo_yomi_time > 0 with
+        byo_yomi_stones == 0 means no time limit; the fixed move time is used then.
+        """
+        self.main_time = main_time
+        self.byo_yomi_time = byo_yomi_time
+        self.byo_yomi_stones = byo_yomi_stones
+        self.clock = not (byo_yomi_time > 0 and byo_yomi_stones == 0)
+        for color in (BLACK, WHITE):
+            self.time_left[color] = main_time
+            self.stones_left[color] = 0
+            if main_time <= 0:
+                self.time_left[color] = byo_yomi_time
+                self.stones_left[color] = byo_yomi_stones
+
+    def set_time_left(self, color: GO_COLOR, seconds: float, stones: int) -> None:
+        """
+        GTP time_left: seconds left for color, stones == 0 in main time.
+        """
+        self.time_left[color] = seconds
+        self.stones_left[color] = stones
+
+    def budget(self, board: GoBoard, color: GO_COLOR) -> float:
+        """
+        Seconds to search for color's move on board.
+        """
+        if not self.clock:
+            return self.move_time
+        available = self.time_left[color] - SAFETY_MARGIN
+        if self.stones_left[color] > 0:
+            budget = available / self.stones_left[color]
+        else:
+            moves_left = max(MIN_MOVES_LEFT, board.n_empty * EXPECTED_FILL / 2)
+            budget = available / moves_left
+            if self.byo_yomi_stones > 0:
+                # Running over the main time only eats into the first period
+                byo_yomi = (self.byo_yomi_time - SAFETY_MARGIN) / self.byo_yomi_stones
+                budget = min(budget + byo_yomi, available + byo_yomi)
+        return max(MIN_MOVE_TIME, budget)
+
+    def record(self, color: GO_COLOR, seconds: float) -> None:
+        """
+        Run color's clock down by the seconds spent on a move.
+        """
+        if not self.clock:
+            return
+        self.time_left[color] -= seconds
+        if self.stones_left[color] > 0:
+            self.stones_left[color] -= 1
+            if self.stones_left[color] == 0:
+                self.time_left[color] = self.byo_yomi_time
+                self.stones_left[color] = self.byo_yomi_stones
+        elif self.time_left[color] <= 0 and self.byo_yomi_stones > 0:
+            self.time_left[color] += self.byo_yomi_time
+            self.stones_left[color] = self.byo_yomi_stones
+
+
+def top_two(visits: Iterable[int]) -> Tuple[int, int]:
+    """
+    The largest and second largest of visits (0 for missing ones).
+    """
+    largest = heapq.nlargest(2, visits)
+    largest += [0] * (2 - len(largest))
+    return largest[0], largest[1]
+
+
+def decided(best: int, second: int, simulations: int, elapsed: float, remaining: float) -> bool:
+    """
+    True if the child with second visits can no longer overtake the one with
+    best visits: the lead is larger than the number of simulations that fit
+    in the remaining time at the rate seen so far.
+    """
+    if simulations == 0 or elapsed <= 0:
+        return False
+    return best - second > simulations / elapsed * remaining
@@ -0,0 +1,50 @@
+"""
+transposition.py
+Bounded transposition table for CustomMCTS.
+
+Maps the Zobrist hash of a position (GoBoard.hash) to the tree node that
+holds its statistics, so positions reached through different move orders
+share one node. When the table is full the least recently used entry is
+dropped; the node itself stays in the tree, it just stops being shared.
+"""
+from collections import OrderedDict
+from typing import Optional, Set
+
+from tree import CustomTreeNode
+
+DEFAULT_TABLE_SIZE: int = 200000
+
+
+class TranspositionTable(object):
+    def __init__(self, capacity: int = DEFAULT_TABLE_SIZE) -> None:
+        assert capacity > 0
+        self.capacity: int = capacity
+        self.table: 'OrderedDict[int, CustomTreeNode]' = OrderedDict()
+        self.hits: int = 0
+
+    def get(self, key: int) -> Optional[CustomTreeNode]:
+        node = self.table.get(key)
+        if node is not None:
+            self.table.move_to_end(key)
+            self.hits += 1
+        return node
+
+    def put(self, key: int, node: CustomTreeNode) -> None:
+        self.table[key] = node
+        self.table.move_to_end(key)
+        if len(self.table) > self.capacity:
+            self.table.popitem(last=False)
+
+    def retain(self, node_ids: Set[int]) -> None:
+        """
+        Drop the entries whose node's id() is not in node_ids, keeping the order of the others.
+        """
+        for key in [key for key, node in self.table.items() if id(node) not in node_ids]:
+            del self.table[key]
+
+    def clear(self) -> None:
+        self.table.clear()
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self.table)
@@ -1,37 +1,39 @@
-from board_base import opponent as get_opponent, BLACK, WHITE, PASS, GO_COLOR, GO_POINT, NO_POINT, coord_to_point
+from board_base import opponent as get_opponent, BLACK, WHITE, EMPTY, PASS, GO_COLOR, GO_POINT, NO_POINT, coord_to_point
 from board import GoBoard
 from board_util import GoBoardUtil
 from gtp_connection import point_to_coord, format_point
 import numpy as np
 import os, sys
-from typing import Dict, Tuple
+from typing import Dict, List, Set, Tuple
 import time
 from math import sqrt, log
 from random import choice   
+
+"""
+Approximate bytes of a visited node on 64-bit CPython: the object, its
+attribute and children dicts, its move key in the parent's children and
+priors, the float win count and heuristic value. pool_mcts.node_benchmark measures
+about 270 bytes for a node that has not been visited yet.
+"""
+NODE_BYTES: int = 320
+
 class CustomTreeNode:
     def __init__(self, color: GO_COLOR) -> None:
+        # The move that created the node. A transposed node is shared by several
+        # parents (see CustomMCTS.transpose), so edges use their own move key.
         self.move: GO_POINT = NO_POINT
         self.color: GO_COLOR = color
         self.n_visits: int = 0
         self.n_opponent_wins: float = 0
-        self.h_value: int = None
-        self.parent: 'CustomTreeNode' = self
+        # priors[move]: heuristic value of the edge to children[move], set when first selected
+        self.priors: Dict[GO_POINT, float] = {}
+        # Game theoretic value once known: the winner with best play, EMPTY
+        # for a draw, None while unproven (see solve)
+        self.proven: GO_COLOR = None
+        # No parent link: without reference cycles a subtree is freed as soon as it is dropped.
+        # The search records the descent path instead (see backup).
         self.children: Dict[GO_POINT, 'CustomTreeNode'] = {}
         self.exp: bool = False
-    def backpropagate(self, winner: GO_COLOR) -> None:
-        """
-        Backpropagate the result of the game up the tree.
-        """
-        node = self
-        while node is not None and not node.is_root():
-            node.update(winner)
-            node = node.parent
-
-    def is_fully_expanded(self) -> bool:
-        """
-        Check if all possible children are expanded.
-        """
-        return len(self.children) == len(self.parent.children)
 
     def simulate(self, board: GoBoard) -> GO_COLOR:
         """
@@ -67,12 +69,15 @@ class CustomTreeNode:
         """
         Returns the size of the subtree rooted at this node.
         """
-        size = 1  # Count this node
-        for child in self.children.values():
-            size += child.tree_size()
-        return size
-    def set_parent(self, parent: 'CustomTreeNode') -> None:
-        self.parent: 'CustomTreeNode' = parent
+        return count_nodes(self)
+
+    def collapse(self) -> None:
+        """
+        Drop the subtree below this node, keeping its statistics. It is expanded again when selected.
+        """
+        self.children = {}
+        self.priors = {}
+        self.exp = False
 
     def expdf(self, board: GoBoard, color: GO_COLOR) -> None:
         opp_color = get_opponent(board.current_player)
@@ -80,46 +85,113 @@ class CustomTreeNode:
         for move in moves:
             node = CustomTreeNode(opp_color)
             node.move = move
-            node.set_parent(self)
             self.children[move] = node
         self.exp = True
     
     def select_in_tree(self, exploration: float, heuristic_weight: float, board: GoBoard) -> Tuple[GO_POINT, 'CustomTreeNode']:
+        """
+        The unproven child with the best UCT value, or (NO_POINT, None) once the
+        node is proven: a child is won for the player to move, or all are proven.
+        """
+        selected_move = NO_POINT
         selected_child = None
         uct_value = -1
         for move, child in self.children.items():
+            if child.proven == self.color:
+                self.solve()
+                return NO_POINT, None
             if child.n_visits == 0:
-                return child.move, child
-            if child.h_value is None:
-                child.h_value = board.cc_heur(child.move, child.color)
-            current_uct_value = self.uct_custom(child.n_opponent_wins, child.n_visits, self.n_visits, exploration, child.h_value, heuristic_weight)
-            if current_uct_value > uct_value:
+                return move, child
+            current_uct_value = self.uct_custom(child.n_opponent_wins, child.n_visits, self.n_visits, exploration, self.prior(move, child, board), heuristic_weight)
+            if current_uct_value > uct_value and child.proven is None:
                 uct_value = current_uct_value
+                selected_move = move
                 selected_child = child
-        return selected_child.move, selected_child
+        return selected_move, selected_child
     
+    def prior(self, move: GO_POINT, child: 'CustomTreeNode', board: GoBoard) -> float:
+        """
+        Heuristic value of the edge to child by move, computed on board at this node the first time.
+        """
+        heuristic = self.priors.get(move)
+        if heuristic is None:
+            heuristic = board.cc_heur(move, child.color)
+            self.priors[move] = heuristic
+        return heuristic
+
+    def solve(self) -> bool:
+        """
+        MCTS-Solver rule: the node is won for the player to move if a child is
+        won for them, and decided by its best child once all children are proven.
+        Returns whether the node is proven.
+        """
+        if self.proven is not None:
+            return True
+        result = get_opponent(self.color)
+        for child in self.children.values():
+            if child.proven == self.color:
+                self.proven = self.color
+                return True
+            if child.proven is None:
+                result = None
+            elif child.proven == EMPTY and result is not None:
+                result = EMPTY
+        if result is None or not self.children:
+            return False
+        self.proven = result
+        return True
+
+    def proven_child(self) -> Tuple[GO_POINT, 'CustomTreeNode']:
+        """
+        For a proven node, the most visited child that keeps its value, or (NO_POINT, None).
+        """
+        best_move = NO_POINT
+        best_child = None
+        for move, child in self.children.items():
+            if child.proven == self.proven and (best_child is None or child.n_visits > best_child.n_visits):
+                best_move = move
+                best_child = child
+        return best_move, best_child
+
     def select_best_child(self) -> Tuple[GO_POINT, 'CustomTreeNode']:
-        max_visits = -1
+        """
+        The most visited child, taking a child proven won for the player to move
+        first and a child proven lost only if all are.
+        """
+        lost = get_opponent(self.color)
+        best_key = None
+        best_move = NO_POINT
         best_child = None
         for move, child in self.children.items():
-            if child.n_visits > max_visits:
-                max_visits = child.n_visits
+            key = (child.proven == self.color, child.proven != lost, child.n_visits)
+            if best_key is None or key > best_key:
+                best_key = key
+                best_move = move
                 best_child = child
-        return best_child.move, best_child
+        return best_move, best_child
     
+    def add_virtual_loss(self, n: int) -> None:
+        """
+        Count n pending playouts as visits without wins, so that other
+        descents made before they finish are steered elsewhere.
+        """
+        self.n_visits += n
+
+    def remove_virtual_loss(self, n: int) -> None:
+        self.n_visits -= n
+
     def update(self, winner: GO_COLOR) -> None:
+        """
+        Record one playout result in this node only.
+        Use backup() to update a whole path.
+        """
         self.n_opponent_wins += self.color != winner
         self.n_opponent_wins -= (winner == 0) / 2
         self.n_visits += 1
-        if not self.is_root():
-            self.parent.update(winner)
-    
+
     def is_leaf(self) -> bool:
         return len(self.children) == 0
     
-    def is_root(self) -> bool:
-        return self.parent == self
-    
     def __str__(self) -> str:
         return f"Move: {self.move}, Color: {self.color}, Wins: {self.n_opponent_wins}, Visits: {self.n_visits}"
     
@@ -129,3 +201,59 @@ class CustomTreeNode:
     @staticmethod
     def uct_custom(child_wins: int, child_visits: int, parent_visits: int, exploration: float, heuristic: float, heuristic_weight: float) -> float:
         return child_wins / child_visits + exploration * sqrt(log(parent_visits) / child_visits) + ((heuristic_weight / (child_visits + 1)) * heuristic)
+
+
+def node_ids(root: CustomTreeNode) -> Set[int]:
+    """
+    id() of every node below and including root.
+    """
+    seen = {id(root)}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in node.children.values():
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+    return seen
+
+
+def count_nodes(root: CustomTreeNode) -> int:
+    """
+    Number of distinct nodes below and including root, transposed nodes counted once.
+    """
+    return len(node_ids(root))
+
+
+def backup(path: List[CustomTreeNode], winner: GO_COLOR) -> None:
+    """
+    Add one playout result to every node of path, the nodes visited by one descent.
+    A single loop, no recursion, so tree depth does not matter.
+    """
+    draw = (winner == 0) / 2
+    for node in path:
+        node.n_opponent_wins += (node.color != winner) - draw
+        node.n_visits += 1
+
+
+def solve_path(path: List[CustomTreeNode]) -> None:
+    """
+    After the last node of path was proven, prove its ancestors on path as far as the solver rules allow.
+    """
+    for node in reversed(path[:-1]):
+        if not node.solve():
+            return
+
+
+def backup_many(path: List[CustomTreeNode], winners: np.ndarray) -> None:
+    """
+    Add several playout results of the same leaf to every node of path in one pass.
+    """
+    n = len(winners)
+    black_wins = int(np.count_nonzero(winners == BLACK))
+    white_wins = int(np.count_nonzero(winners == WHITE))
+    draw = (n - black_wins - white_wins) / 2
+    wins = {BLACK: n - black_wins - draw, WHITE: n - white_wins - draw}
+    for node in path:
+        node.n_opponent_wins += wins[node.color]
+        node.n_visits += n
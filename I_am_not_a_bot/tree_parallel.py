@@ -0,0 +1,220 @@
+"""
+tree_parallel.py
+Tree-parallel MCTS: several processes grow one tree in shared memory.
+
+The node statistics live in numpy arrays backed by a
+multiprocessing.shared_memory block, so every worker selects, expands and
+backpropagates in the same tree. Visit and win counts are updated without
+locks, as in lock-free tree parallelisation; a rare lost update only costs
+one sample. Expansion allocates a contiguous child range under a lock.
+Virtual loss on the nodes of a descent that has not finished yet makes
+other workers prefer different leaves. It is added to the whole path once
+selection is done, before the rollout, and removed after it, each time in
+one update under the lock: a lost update would stay wrong for the rest of
+the move, and could leave visits + vloss at zero or below in
+NodePool.select. Taking the lock per path rather than per ply keeps the
+workers from queuing on it at every step of the descent.
+
+The tree is a NodePool (see node_pool.py for the node fields) whose
+buffer is the shared memory block.
+"""
+import multiprocessing as mp
+import random
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import List, Tuple
+
+import numpy as np
+
+from board_base import opponent as get_opponent, BLACK, WHITE, EMPTY, GO_COLOR, GO_POINT
+from board import GoBoard
+from bitboard import BitBoard
+from mcts import CustomMCTS
+from node_pool import NodePool, pool_nbytes, UNEXPANDED, EXPANDED, TERMINAL
+
+DEFAULT_CAPACITY: int = 1000000
+VIRTUAL_LOSS: int = 3
+IPC_MARGIN: float = 0.05
+
+
+class SharedTree(NodePool):
+    def __init__(self, capacity: int, name: str = None) -> None:
+        """
+        Create a shared tree for up to capacity nodes, or attach to the one called name.
+        """
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=pool_nbytes(capacity))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name: str = self.shm.name
+        NodePool.__init__(self, capacity, self.shm.buf)
+
+    def expand(self, node: int, board: GoBoard, lock) -> None:
+        """
+        Create the children of node, one per empty point of board.
+        Does nothing if another worker expanded it first or the tree is full.
+        """
+        with lock:
+            if self.state[node] != UNEXPANDED:
+                return
+            NodePool.expand(self, node, board.get_empty_points())
+
+    def add_virtual_loss(self, nodes: List[int], n: int, lock) -> None:
+        """
+        Add n virtual losses to each of nodes; n < 0 removes them.
+        """
+        with lock:
+            self.vloss[nodes] += n
+
+    def root_children(self) -> List[Tuple[GO_POINT, int, float]]:
+        """
+        (move, visits, wins) of every child of the root.
+        """
+        return [(GO_POINT(self.move[i]), int(self.visits[i]), float(self.wins[i]))
+                for i in self.children(0)]
+
+    def close(self) -> None:
+        # Drop the numpy views first, the block cannot close while they exist
+        self.buffer = None
+        self.header = None
+        for field in list(self.__dict__):
+            if isinstance(self.__dict__[field], np.ndarray):
+                self.__dict__[field] = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+
+def _simulate(tree: SharedTree, board: GoBoard, color: GO_COLOR, exploration: float,
+              heuristic_weight: float, lock) -> None:
+    """
+    One descent, rollout and backup on the shared tree. board is rolled back by the caller.
+    """
+    node = 0
+    path = [0]
+    while True:
+        terminal, winner = board.EndGame()
+        if terminal:
+            tree.state[node] = TERMINAL
+            break
+        if tree.state[node] == UNEXPANDED:
+            tree.expand(node, board, lock)
+            tree.add_virtual_loss(path, VIRTUAL_LOSS, lock)
+            winner = CustomMCTS.rollout(BitBoard.for_rollout(board), color)
+            tree.add_virtual_loss(path, -VIRTUAL_LOSS, lock)
+            break
+        node = tree.select(node, board, exploration, heuristic_weight)
+        path.append(node)
+        board.play_move(tree.move[node], color)
+        color = get_opponent(color)
+    tree.backup(path, winner)
+
+
+def _worker(conn: Connection, name: str, capacity: int, lock, seed: int) -> None:
+    """
+    Worker process loop: attach to the shared tree and search on request.
+    """
+    random.seed(seed)
+    tree = SharedTree(capacity, name)
+    while True:
+        message = conn.recv()
+        if message[0] == "close":
+            break
+        _, board, color, deadline, exploration, heuristic_weight = message
+        n_moves = len(board.move_history)
+        simulations = 0
+        while time.time() < deadline:
+            _simulate(tree, board, color, exploration, heuristic_weight, lock)
+            board.undo_to(n_moves)
+            simulations += 1
+        conn.send(simulations)
+    tree.close()
+    conn.close()
+
+
+class TreeParallelMCTS:
+    def __init__(self, n_workers: int, capacity: int = DEFAULT_CAPACITY, seed: int = None) -> None:
+        """
+        Create the shared tree and start n_workers processes that search it together.
+        The processes are reused for every move.
+        """
+        assert n_workers >= 1
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        self.n_workers: int = n_workers
+        self.tree: SharedTree = SharedTree(capacity)
+        self.tree.reset(BLACK)
+        self.toplay: GO_COLOR = BLACK
+        self.simulations: int = 0
+        self.lock = mp.Lock()
+        self.connections: List[Connection] = []
+        self.processes: List[mp.Process] = []
+        for i in range(n_workers):
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(target=_worker, args=(child_conn, self.tree.name, capacity, self.lock, seed + i),
+                                 daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    def get_move(self, board: GoBoard, color: GO_COLOR, time_limit: float, exp: float, hw: float) -> GO_POINT:
+        """
+        Search a fresh shared tree for time_limit seconds with all workers
+        and return the most visited root move.
+        """
+        self.toplay = color
+        self.tree.reset(color)
+        self.tree.expand(0, board, self.lock)
+        deadline = time.time() + max(time_limit - IPC_MARGIN, 0.05)
+        for conn in self.connections:
+            conn.send(("search", board, color, deadline, exp, hw))
+        self.simulations = sum(conn.recv() for conn in self.connections)
+        children = self.tree.root_children()
+        best_move, best_visits, best_wins = max(children, key=lambda c: c[1])
+        return best_move
+
+    def update_with_move(self, last_move: GO_POINT) -> None:
+        self.toplay = get_opponent(self.toplay)
+
+    def reset(self) -> None:
+        self.toplay = BLACK
+        self.tree.reset(BLACK)
+
+    def close(self) -> None:
+        for conn in self.connections:
+            conn.send(("close",))
+        for process in self.processes:
+            process.join(timeout=1)
+        self.connections = []
+        self.processes = []
+        self.tree.close()
+        self.tree.unlink()
+
+    def get_toplay(self) -> GO_COLOR:
+        return self.toplay
+
+
+def scaling_benchmark(size: int = 9, time_limit: float = 2.0, max_workers: int = 16) -> None:
+    """
+    Print simulations per second of TreeParallelMCTS on an empty board
+    for 1, 2, 4, ... up to max_workers processes.
+    """
+    workers = 1
+    base = None
+    while workers <= max_workers:
+        search = TreeParallelMCTS(workers)
+        board = GoBoard(size)
+        search.get_move(board, BLACK, time_limit, 0.6, 1)
+        rate = search.simulations / time_limit
+        if base is None:
+            base = rate
+        print("workers {:2d}: {:9.0f} simulations/s  speedup {:5.2f}".format(workers, rate, rate / base))
+        search.close()
+        workers *= 2
+
+
+if __name__ == "__main__":
+    scaling_benchmark()
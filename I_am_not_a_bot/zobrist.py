@@ -0,0 +1,51 @@
+"""
+zobrist.py
+Zobrist hashing keys for GoBoard positions.
+
+A position key is the XOR of one random 64-bit key per stone on the board,
+one key for the side to move and one key per (color, capture count).
+GoBoard keeps the key up to date incrementally in play_move, play_rm, undo_move and undo,
+so two boards reached through different move orders get the same hash.
+"""
+import random
+from functools import lru_cache
+from typing import List
+
+from board_base import board_array_size, BLACK, WHITE
+
+"""
+Keys are generated from a fixed seed per board size, so hashes are stable
+between runs. Anything stored on disk and keyed by a hash relies on this.
+"""
+ZOBRIST_SEED: int = 455
+
+
+class ZobristKeys(object):
+    def __init__(self, size: int) -> None:
+        """
+        Random keys for a board of the given size.
+
+        stones[color][point]: key of a stone of color on point
+        to_play[color]: key for color being the side to move
+        captures[color][count]: key for color having captured count stones
+        """
+        rng = random.Random(ZOBRIST_SEED * 1000 + size)
+        maxpoint: int = board_array_size(size)
+        self.size: int = size
+        self.stones: List[List[int]] = [[0] * maxpoint for _ in range(3)]
+        for color in (BLACK, WHITE):
+            self.stones[color] = [rng.getrandbits(64) for _ in range(maxpoint)]
+        self.to_play: List[int] = [0, 0, rng.getrandbits(64)]
+        # A color can never have captured more stones than were ever placed,
+        # so twice the number of points is a safe bound on the count.
+        self.captures: List[List[int]] = [[0] * (2 * maxpoint + 2) for _ in range(3)]
+        for color in (BLACK, WHITE):
+            self.captures[color] = [0] + [rng.getrandbits(64) for _ in range(2 * maxpoint + 1)]
+
+
+@lru_cache(maxsize=None)
+def get_zobrist_keys(size: int) -> ZobristKeys:
+    """
+    Return the keys for a board size. They are created once and shared by all boards.
+    """
+    return ZobristKeys(size)